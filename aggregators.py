@@ -0,0 +1,174 @@
+"""
+Aggregator Registry
+-------------------
+
+Describes well known aggregating functions so a tree can pick a faster
+strategy for them than calling fn once per child per ancestor.
+
+An Aggregator records, for one fn:
+
+- identity: the value e with fn(x, e) == x, used to pad child indexes.
+- inverse: a function with inverse(fn(a, b), b) == a, if there is one.
+  Trees then keep an O(1) running aggregate over each node's children.
+- exact: True if the inverse gives back a exactly for every value, as xor
+  does. Subtraction does not for floats (inf - inf, 1e16 + 1 - 1e16), so
+  only exact inverses are picked by child_index="auto".
+- idempotent: True if fn(x, x) == x. Adding a subtree can then update each
+  ancestor as fn(old, added) without refolding its children.
+- reduce: a function folding a whole non-empty list in one call, usually a
+  builtin, used when refolding a node and when flattening.
+
+Lookups are by identity of the function object, so operator.add is
+recognised but an equivalent lambda is not; register the lambda to get the
+same treatment.
+
+fuse() combines several named functions into one that folds tuples of
+values component-wise, so a single tree walk maintains all of them.
+"""
+
+import collections
+import functools
+import math
+import operator
+
+
+class Aggregator:
+    """
+    Properties of an associative and commutative aggregating function.
+    """
+
+    def __init__(self, fn, identity=None, inverse=None, idempotent=False,
+                 reduce=None, exact=False):
+        """
+        :param fn: The aggregating function.
+        :param identity: Its identity element, None if it has none.
+        :param inverse: Its inverse, None if it has none.
+        :param idempotent: True if fn(x, x) == x.
+        :param reduce: Folds a non-empty list in one call, defaults to
+        functools.reduce over fn.
+        :param exact: True if inverse is exact for all values.
+        """
+        self.fn = fn
+        self.identity = identity
+        self.inverse = inverse
+        self.exact = exact and inverse is not None
+        self.idempotent = idempotent
+        if reduce is None:
+            reduce = functools.partial(functools.reduce, fn)
+        self.reduce = reduce
+
+
+_registry = {}
+
+
+def register(fn, identity=None, inverse=None, idempotent=False, reduce=None,
+             exact=False):
+    """
+    Declares the properties of an aggregating function, replacing any
+    earlier declaration for it.
+    :param fn: The aggregating function.
+    :param identity: Its identity element, None if it has none.
+    :param inverse: Its inverse, None if it has none.
+    :param idempotent: True if fn(x, x) == x.
+    :param reduce: Folds a non-empty list in one call.
+    :param exact: True if inverse is exact for all values.
+    :return: The new Aggregator.
+    """
+    aggregator = Aggregator(fn, identity, inverse, idempotent, reduce, exact)
+    _registry[fn] = aggregator
+    return aggregator
+
+
+def lookup(fn):
+    """
+    :param fn: An aggregating function.
+    :return: Its Aggregator, or None if it was never registered.
+    """
+    return _registry.get(fn)
+
+
+class Aggregates(tuple):
+    """
+    The values of a fused aggregator, one per name. Indexable by position,
+    by name (values["max"]) and as attributes (values.max).
+    """
+
+    __slots__ = ()
+    _index = {}
+
+    def __getitem__(self, i):
+        if isinstance(i, str):
+            i = self._index[i]
+        return tuple.__getitem__(self, i)
+
+
+_fused = {}
+
+
+def fuse(fns):
+    """
+    Combines several aggregating functions into one over Aggregates tuples,
+    registered with the identity, inverse and idempotence that all of its
+    parts share, so the fused function keeps their fast paths.
+    If every part is registered, the fused function is registered and
+    cached, and fusing the same functions under the same names again returns
+    the same function. Otherwise nothing is kept, so fusing fresh lambdas
+    per tree does not grow the registry.
+    :param fns: Dict from name to aggregating function.
+    :return: The fused function.
+    """
+    spec = tuple(fns.items())
+    if spec in _fused:
+        return _fused[spec]
+    if not spec:
+        raise ValueError("nothing to fuse")
+
+    names = tuple(fns)
+    parts = tuple(fns.values())
+    base = collections.namedtuple("Aggregates", names)
+    cls = type("Aggregates", (Aggregates, base), {
+        "__slots__": (),
+        "_index": {name: i for i, name in enumerate(names)},
+    })
+    new = tuple.__new__
+
+    def fused(a, b):
+        return new(cls, [f(x, y) for f, x, y in zip(parts, a, b)])
+
+    fused.names = names
+    fused.parts = parts
+    fused.values = lambda values: new(cls, values)
+
+    found = [lookup(f) for f in parts]
+    if any(a is None for a in found):
+        return fused
+    identity = None
+    if all(a.identity is not None for a in found):
+        identity = new(cls, [a.identity for a in found])
+    inverse = None
+    if all(a.inverse is not None for a in found):
+        inverses = tuple(a.inverse for a in found)
+
+        def inverse(a, b):
+            return new(cls, [f(x, y) for f, x, y in zip(inverses, a, b)])
+    reduces = tuple(a.reduce for a in found)
+
+    def reduce(values):
+        return new(cls, [r(list(column))
+                         for r, column in zip(reduces, zip(*values))])
+
+    register(fused, identity, inverse, all(a.idempotent for a in found),
+             reduce, all(a.exact for a in found))
+    _fused[spec] = fused
+    return fused
+
+
+register(operator.add, identity=0, inverse=operator.sub, reduce=sum)
+register(operator.mul, identity=1, reduce=math.prod)
+register(operator.xor, identity=0, inverse=operator.xor, exact=True)
+register(max, identity=-math.inf, idempotent=True, reduce=max)
+register(min, identity=math.inf, idempotent=True, reduce=min)
+register(math.gcd, identity=0, idempotent=True,
+         reduce=lambda values: math.gcd(*values))
+register(operator.and_, identity=-1, idempotent=True)
+register(operator.or_, identity=0, idempotent=True)
@@ -0,0 +1,281 @@
+"""
+Array Backed Tree
+-----------------
+
+A compact variant of tree.Tree for very large trees with integer keys.
+
+Instead of one Python object per node, every node is a row in five
+array('q') columns: key, parent, subtree value, first child and next
+sibling, which is 40 bytes per node. Links are row numbers, -1 meaning none.
+Keys and subtree values must fit in a signed 64 bit integer.
+
+The public API matches tree.Tree: create_root, new_node, put, flatten and
+swap take and return ArrayNode handles. A handle is only a (tree, row) pair
+and is created on demand, so holding on to handles is optional.
+
+Children are kept as a singly linked list, newest first, so put is O(1)
+while detaching a child (in swap) walks the parent's child list.
+"""
+
+from array import array
+
+import tree as _tree
+
+
+class ArrayNode:
+    """
+    Handle to a row of an ArrayTree. Supports the same read API as node.Node.
+    """
+
+    __slots__ = ("tree", "row")
+
+    def __init__(self, tree, row):
+        """
+        :param tree: The ArrayTree holding the node.
+        :param row: The row of the node in the tree's columns.
+        """
+        self.tree = tree
+        self.row = row
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayNode) and \
+            self.tree is other.tree and self.row == other.row
+
+    def __hash__(self):
+        return hash(self.row)
+
+    @property
+    def key(self):
+        return self.tree.keys[self.row]
+
+    @property
+    def subtree_value(self):
+        return self.tree.values[self.row]
+
+    @property
+    def parent(self):
+        row = self.tree.parents[self.row]
+        return None if row < 0 else ArrayNode(self.tree, row)
+
+    @property
+    def children(self):
+        """
+        The children in insertion order, built on each access.
+        """
+        return [ArrayNode(self.tree, row) for row in self.tree._child_rows(self.row)]
+
+    def is_external(self):
+        """
+        Checks if the node is a leaf node in the tree.
+        :return: Boolean, True if leaf, False otherwise.
+        """
+        return self.tree.first_child[self.row] < 0
+
+    def get_children(self):
+        """
+        Returns the children of the current node.
+        :return: List of children.
+        """
+        return self.children
+
+
+class ArrayTree:
+    def __init__(self, fn):
+        self.fn = fn
+        self.root = None
+
+        self.keys = array("q")
+        self.parents = array("q")
+        self.values = array("q")
+        self.first_child = array("q")
+        self.next_sibling = array("q")
+
+        # number of nodes refolded by the last put/flatten/swap
+        self.last_touched = 0
+
+    @classmethod
+    def from_parent_array(cls, keys, parents, fn):
+        """
+        Builds a whole tree at once, linking every row first and then
+        folding all subtree values in one bottom-up pass.
+        :param keys: The key of each node.
+        :param parents: The row of each node's parent, -1 or None for the root.
+        :param fn: The aggregating function.
+        :return: The new tree.
+        """
+        if len(keys) != len(parents):
+            raise ValueError("keys and parents differ in length")
+
+        tree = cls(fn)
+        n = len(keys)
+        tree.keys = array("q", keys)
+        tree.values = array("q", keys)
+        tree.parents = array("q", (-1 if p is None else p for p in parents))
+        tree.first_child = array("q", [-1]) * n
+        tree.next_sibling = array("q", [-1]) * n
+
+        # link in row order, as put would, so siblings read back in row order
+        root = -1
+        for row in range(n):
+            p = tree.parents[row]
+            if p < 0:
+                if root >= 0:
+                    raise ValueError("parent array has more than one root")
+                root = row
+                continue
+            tree.next_sibling[row] = tree.first_child[p]
+            tree.first_child[p] = row
+
+        if root < 0:
+            raise ValueError("parent array has no root")
+        tree.root = ArrayNode(tree, root)
+
+        order = [root]
+        for row in order:
+            order.extend(tree._child_rows(row))
+        if len(order) != n:
+            raise ValueError("parent array does not describe a single tree")
+
+        for row in reversed(order):
+            p = tree.parents[row]
+            if p >= 0:
+                tree.values[p] = fn(tree.values[p], tree.values[row])
+
+        return tree
+
+    def __len__(self):
+        return len(self.keys)
+
+    def create_root(self, root_key):
+        assert self.root == None, "cannot create root in non-empty tree"
+        self.root = self.new_node(root_key)
+
+    def new_node(self, key):
+        row = len(self.keys)
+        self.keys.append(key)
+        self.parents.append(-1)
+        self.values.append(key)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return ArrayNode(self, row)
+
+    def put(self, parent, child):
+        p = parent.row
+        c = child.row
+
+        # a row can only sit in one sibling list, so putting an attached
+        # node moves it
+        old = self.parents[c]
+        if old >= 0:
+            self._detach(old, c)
+
+        self.next_sibling[c] = self.first_child[p]
+        self.first_child[p] = c
+        self.parents[c] = p
+
+        touched = self._update_rows(p)
+        # the old parent and its ancestors still hold the moved subtree
+        if old >= 0 and old != p:
+            touched += self._update_rows(old)
+        self.last_touched = touched
+
+    def flatten(self, node, fn):
+        row = node.row
+        if self.first_child[row] < 0:
+            return node
+
+        keys = [self.keys[row]]
+
+        # every row below node, visited once with an explicit stack
+        stack = self._child_rows(row)
+        for c in stack:
+            self.parents[c] = -1
+        while stack:
+            r = stack.pop()
+            keys.append(self.keys[r])
+            stack.extend(self._child_rows(r))
+
+        result = _tree.reduce_keys(fn, keys)
+
+        # the rows of the discarded descendants are not reused
+        self.keys[row] = result
+        self.values[row] = result
+        self.first_child[row] = -1
+
+        self.last_touched = 0
+        if self.parents[row] >= 0:
+            self.last_touched = self._update_rows(self.parents[row])
+
+        return node
+
+    def swap(self, node_a, node_b):
+        self.last_touched = 0
+        if node_a == node_b:
+            return
+
+        a_parent = self.parents[node_a.row]
+        b_parent = self.parents[node_b.row]
+
+        self._detach(a_parent, node_a.row)
+        self._detach(b_parent, node_b.row)
+
+        touched = 0
+        self.put(ArrayNode(self, b_parent), node_a)
+        touched += self.last_touched
+        self.put(ArrayNode(self, a_parent), node_b)
+        touched += self.last_touched
+        self.last_touched = touched
+
+    def update_subtree(self, node):
+        """
+        Refolds the subtree value of node and of each of its ancestors,
+        stopping at the first one that does not change.
+        :param node: The lowest node whose children changed.
+        :return: The number of nodes that were refolded.
+        """
+        return self._update_rows(node.row)
+
+    def _update_rows(self, row):
+        fn = self.fn
+        values = self.values
+        next_sibling = self.next_sibling
+        touched = 0
+
+        while row >= 0:
+            touched += 1
+
+            value = self.keys[row]
+            c = self.first_child[row]
+            while c >= 0:
+                value = fn(value, values[c])
+                c = next_sibling[c]
+
+            if value == values[row]:
+                break
+
+            values[row] = value
+            row = self.parents[row]
+
+        return touched
+
+    def _child_rows(self, row):
+        rows = []
+        c = self.first_child[row]
+        while c >= 0:
+            rows.append(c)
+            c = self.next_sibling[c]
+        rows.reverse()
+        return rows
+
+    def _detach(self, parent, row):
+        # unlink row from the sibling list of parent
+        c = self.first_child[parent]
+        if c == row:
+            self.first_child[parent] = self.next_sibling[row]
+        else:
+            while self.next_sibling[c] != row:
+                c = self.next_sibling[c]
+            self.next_sibling[c] = self.next_sibling[row]
+
+        self.parents[row] = -1
+        self.next_sibling[row] = -1
@@ -0,0 +1,167 @@
+"""
+Async Tree
+----------
+
+An asyncio facade over a tree.Tree, for trees living inside an event loop.
+
+    t = AsyncTree(tree.Tree(max))
+    await t.put(parent, child)
+    value = await t.read(child)
+
+Mutations are serialised through a write queue (a FIFO asyncio.Lock), so
+they take effect one after the other in the order they were awaited.
+read() waits its turn in the same queue, so it sees every mutation awaited
+before it in full.
+
+Long walks give the loop a chance to run other tasks every chunk_size
+nodes:
+
+- the refold of put, swap and flatten climbs the ancestors chunk_size
+  nodes at a time,
+- flatten collects the keys of the subtree chunk_size nodes at a time, and
+  folds them in an executor thread once there are more than
+  offload_size of them.
+
+Reading node.subtree_value directly, instead of through read(), may see a
+refold that is still under way. All mutations must go through the facade
+while it is in use.
+"""
+
+import asyncio
+
+import aggregators
+import tree as _tree
+
+
+class AsyncTree:
+    def __init__(self, tree, chunk_size=1024, offload_size=1 << 16):
+        """
+        :param tree: The tree.Tree to wrap.
+        :param chunk_size: The number of nodes handled between two yields
+        to the event loop.
+        :param offload_size: flatten folds the keys of larger subtrees in
+        the loop's default executor.
+        """
+        self.tree = tree
+        self.chunk_size = chunk_size
+        self.offload_size = offload_size
+        self._queue = asyncio.Lock()
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    def create_root(self, key, id=None):
+        self.tree.create_root(key, id)
+
+    def new_node(self, key, id=None):
+        return self.tree.new_node(key, id)
+
+    def get(self, id, default=None):
+        return self.tree.get(id, default)
+
+    def __contains__(self, id):
+        return id in self.tree
+
+    async def put(self, parent, child):
+        """
+        Tree.put, with the refold yielding to the loop.
+        """
+        async with self._queue:
+            dirty = self._deferred(self.tree.put, parent, child)
+            await self._refold(dirty)
+
+    async def swap(self, node_a, node_b):
+        """
+        Tree.swap, with the refold yielding to the loop.
+        """
+        async with self._queue:
+            dirty = self._deferred(self.tree.swap, node_a, node_b)
+            await self._refold(dirty)
+
+    async def flatten(self, node, fn):
+        """
+        Tree.flatten, with the traversal and the refold yielding to the
+        loop and large folds done in an executor thread.
+        :return: node
+        """
+        async with self._queue:
+            if node.is_external():
+                return node
+
+            if isinstance(fn, dict):
+                fn = aggregators.fuse(fn)
+            keys = await self._subtree_keys(node)
+            if len(keys) > self.offload_size:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    None, _tree.reduce_keys, fn, keys)
+            else:
+                result = _tree.reduce_keys(fn, keys)
+
+            dirty = self._deferred(self.tree._flatten_to, node, result)
+            await self._refold(dirty)
+            return node
+
+    async def update_subtree(self, node):
+        """
+        Tree.update_subtree, yielding to the loop.
+        :return: The number of nodes that were refolded.
+        """
+        async with self._queue:
+            return await self._refold([node])
+
+    async def read(self, node):
+        """
+        :return: The subtree_value of node once every mutation awaited
+        before this call is done.
+        """
+        async with self._queue:
+            return node.subtree_value
+
+    def _deferred(self, operation, *args):
+        # run a synchronous tree operation with its refold deferred, as in
+        # Tree.batch(), and return the nodes left to refold
+        tree = self.tree
+        tree._dirty = []
+        try:
+            operation(*args)
+        finally:
+            dirty = tree._dirty
+            tree._dirty = None
+        return dirty
+
+    async def _refold(self, dirty):
+        # Tree.update_subtree for each dirty node, one chunk at a time
+        tree = self.tree
+        chunk = self.chunk_size
+        touched = 0
+
+        for node in dirty:
+            while node is not None:
+                touched += 1
+                value = tree._fold(node)
+                if value == node.subtree_value:
+                    break
+                tree._store(node, value)
+                node = node.parent
+
+                if touched % chunk == 0:
+                    await asyncio.sleep(0)
+
+        tree._refolded()
+        tree.last_touched = touched
+        return touched
+
+    async def _subtree_keys(self, node):
+        # Tree._subtree_keys, one chunk at a time
+        chunk = self.chunk_size
+        descendants = list(node.children)
+        keys = []
+        for i, cursor in enumerate(descendants, 1):
+            descendants.extend(cursor.children)
+            keys.append(cursor.key)
+            if i % chunk == 0:
+                await asyncio.sleep(0)
+        keys.append(node.key)
+        return keys
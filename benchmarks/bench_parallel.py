@@ -0,0 +1,85 @@
+"""
+Parallel Aggregation Scaling
+----------------------------
+
+Times Tree.parallel_refold() and Tree.parallel_flatten() on one random
+recursive tree for 1 to N worker processes, next to the single process
+from_parent_array fold and flatten, and prints a JSON report.
+
+    python benchmarks/bench_parallel.py --size 1000000 --workers 1 2 4 8
+
+--work makes the aggregator spin for that many extra iterations per call,
+standing in for an expensive fn.
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tree
+
+
+def busy_max(work, x, y):
+    # max, after work iterations of busy work
+    for _ in range(work):
+        pass
+    return x if x > y else y
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--work", type=int, default=0,
+                        help="extra iterations per fn call")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    n = args.size
+    keys = [rng.randint(0, 1 << 30) for _ in range(n)]
+    parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+    fn = functools.partial(busy_max, args.work)
+
+    t = tree.Tree.from_parent_array(keys, parents, fn)
+    results = {
+        "serial_refold": timed(lambda: t._bulk_fold(
+            list(t.iter_levelorder()))),
+        "serial_flatten": timed(lambda: tree.reduce_keys(
+            fn, t._subtree_keys(t.root))),
+        "parallel_refold": {},
+        "parallel_flatten": {},
+    }
+    for workers in args.workers:
+        results["parallel_refold"][workers] = timed(
+            lambda: t.parallel_refold(workers))
+        results["parallel_flatten"][workers] = timed(
+            lambda: tree.parallel.reduce_keys(fn, t._subtree_keys(t.root),
+                                              workers))
+
+    print(json.dumps({
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "size": n,
+        "work": args.work,
+        "seconds": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Tree Benchmarks
+---------------
+
+Measures put, swap, flatten, update_subtree and bulk loading across tree
+shapes, sizes and aggregators, and writes the results as JSON so runs of
+different versions can be diffed.
+
+    python benchmarks/bench_tree.py --sizes 1000 100000 --out before.json
+    python benchmarks/bench_tree.py --sizes 1000 100000 --compare before.json
+
+Every case runs in a fresh interpreter so that its peak RSS is its own.
+Each case first bulk loads a tree of the given shape and size, then times
+--ops single operations on it and reports ops/sec and latency percentiles
+in microseconds.
+"""
+
+import argparse
+import json
+import operator
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tree
+
+
+def max_agg(x, y):
+    return x if x > y else y
+
+
+AGGREGATORS = {
+    "max": max_agg,
+    "xor": operator.xor,
+    "mul": operator.mul,
+}
+
+SHAPES = ("chain", "star", "kary", "random")
+OPERATIONS = ("bulk", "put", "swap", "update_subtree", "flatten")
+
+
+def parent_array(shape, n, rng, k=3):
+    """
+    Parent array of a tree with n nodes, node 0 being the root.
+    :param shape: "chain", "star", "kary" (complete k-ary) or "random"
+    (random recursive: each node hangs off a uniformly chosen earlier one).
+    :param n: The number of nodes.
+    :param rng: The random.Random to draw from.
+    :param k: The arity of "kary" trees.
+    :return: The list of parents, -1 for the root.
+    """
+    if shape == "chain":
+        return list(range(-1, n - 1))
+    if shape == "star":
+        return [-1] + [0] * (n - 1)
+    if shape == "kary":
+        return [-1] + [(i - 1) // k for i in range(1, n)]
+    if shape == "random":
+        return [-1] + [rng.randrange(i) for i in range(1, n)]
+    raise ValueError("unknown shape {!r}".format(shape))
+
+
+def make_keys(aggregator, n, rng):
+    # products of random keys grow without bound, keep them at +-1
+    if aggregator == "mul":
+        return [rng.choice((-1, 1)) for _ in range(n)]
+    return [rng.randint(0, 1 << 30) for _ in range(n)]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def all_nodes(t):
+    nodes = [t.root]
+    for n in nodes:
+        nodes.extend(n.children)
+    return nodes
+
+
+def run_case(case):
+    """
+    Runs one benchmark case in this process.
+    :param case: Dict with shape, size, aggregator, operation, ops, backend
+    and seed.
+    :return: Dict of the case and its measurements.
+    """
+    rng = random.Random(case["seed"])
+    n = case["size"]
+    fn = AGGREGATORS[case["aggregator"]]
+    kwargs = {}
+    if case["backend"] == "euler":
+        kwargs["backend"] = "euler"
+    elif case["backend"] == "lazy":
+        kwargs["lazy"] = True
+    elif case["backend"] in ("segment", "inverse"):
+        kwargs["child_index"] = case["backend"]
+        kwargs["inverse"] = operator.xor
+
+    keys = make_keys(case["aggregator"], n, rng)
+    parents = parent_array(case["shape"], n, rng)
+
+    latencies = []
+    clock = time.perf_counter_ns
+    operation = case["operation"]
+
+    if operation == "bulk":
+        start = clock()
+        t = tree.Tree.from_parent_array(keys, parents, fn, **kwargs)
+        latencies.append(clock() - start)
+    else:
+        t = tree.Tree.from_parent_array(keys, parents, fn, **kwargs)
+        nodes = all_nodes(t)
+        ops = case["ops"]
+
+        if operation == "put":
+            targets = [rng.choice(nodes) for _ in range(ops)]
+            new = [t.new_node(k) for k in make_keys(case["aggregator"], ops, rng)]
+            for parent, child in zip(targets, new):
+                start = clock()
+                t.put(parent, child)
+                latencies.append(clock() - start)
+
+        elif operation == "swap":
+            # leaves are never ancestors of each other, so any pair is valid
+            leaves = [x for x in nodes if x.is_external()]
+            if len(leaves) >= 2:
+                for _ in range(ops):
+                    a, b = rng.sample(leaves, 2)
+                    start = clock()
+                    t.swap(a, b)
+                    latencies.append(clock() - start)
+
+        elif operation == "update_subtree":
+            # change a key before each call, so it has something to refold;
+            # Euler tour trees keep keys in their tokens and compute values
+            # on read, so there is nothing to time for them
+            if case["backend"] != "euler":
+                flip = case["aggregator"] == "mul"
+                for k in make_keys(case["aggregator"], ops, rng):
+                    x = rng.choice(nodes)
+                    x.key = -x.key if flip else k
+                    start = clock()
+                    t.update_subtree(x)
+                    latencies.append(clock() - start)
+
+        elif operation == "flatten":
+            # a single flatten of the whole tree
+            start = clock()
+            t.flatten(t.root, fn)
+            latencies.append(clock() - start)
+
+        else:
+            raise ValueError("unknown operation {!r}".format(operation))
+
+        # read the root so lazy and Euler tour trees do their deferred work
+        start = clock()
+        t.root.subtree_value
+        if latencies:
+            latencies[-1] += clock() - start
+
+    latencies.sort()
+    total = sum(latencies)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == "darwin" else 1024
+
+    result = dict(case)
+    result.update({
+        "count": len(latencies),
+        "seconds": total / 1e9,
+        "ops_per_sec": len(latencies) / (total / 1e9) if total else None,
+        "p50_us": _us(percentile(latencies, 50)),
+        "p90_us": _us(percentile(latencies, 90)),
+        "p99_us": _us(percentile(latencies, 99)),
+        "max_us": _us(latencies[-1] if latencies else None),
+        "peak_rss_bytes": usage.ru_maxrss * rss_scale,
+    })
+    return result
+
+
+def _us(ns):
+    return None if ns is None else ns / 1000
+
+
+def run_isolated(case):
+    # a fresh interpreter per case keeps peak RSS per case
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True)
+    return json.loads(out.stdout)
+
+
+def case_key(result):
+    return (result["backend"], result["shape"], result["size"],
+            result["aggregator"], result["operation"])
+
+
+def compare(previous, results):
+    """
+    Prints the ops/sec ratio of each case against a previous run.
+    :param previous: The parsed JSON of the previous run.
+    :param results: The results of this run.
+    """
+    before = {case_key(r): r for r in previous["results"]}
+    for r in results:
+        old = before.get(case_key(r))
+        if old is None or not old["ops_per_sec"] or not r["ops_per_sec"]:
+            continue
+        ratio = r["ops_per_sec"] / old["ops_per_sec"]
+        print("{:>8} {:>7} {:>9} {:>4} {:>15}  {:6.2f}x".format(
+            *case_key(r), ratio), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES),
+                        choices=SHAPES)
+    parser.add_argument("--aggregators", nargs="+",
+                        default=list(AGGREGATORS), choices=list(AGGREGATORS))
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS),
+                        choices=OPERATIONS)
+    parser.add_argument("--backends", nargs="+", default=["default"],
+                        choices=["default", "segment", "lazy", "euler"])
+    parser.add_argument("--ops", type=int, default=1000,
+                        help="timed operations per case")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON output to diff against")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    results = []
+    for backend in args.backends:
+        for shape in args.shapes:
+            for size in args.sizes:
+                for aggregator in args.aggregators:
+                    for operation in args.operations:
+                        case = {
+                            "backend": backend,
+                            "shape": shape,
+                            "size": size,
+                            "aggregator": aggregator,
+                            "operation": operation,
+                            "ops": args.ops,
+                            "seed": args.seed,
+                        }
+                        result = run_isolated(case)
+                        results.append(result)
+                        print("{:>8} {:>7} {:>9} {:>4} {:>15} {:>14} ops/s".format(
+                            *case_key(result),
+                            "-" if result["ops_per_sec"] is None
+                            else "{:.1f}".format(result["ops_per_sec"])),
+                            file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
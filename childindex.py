@@ -0,0 +1,178 @@
+"""
+Child Aggregate Indexes
+-----------------------
+
+A child index sits next to node.children and keeps the aggregate of the
+children's subtree values, so that a change in one child does not require
+re-folding every sibling.
+
+Each child remembers its position in the parent's children list as
+node.slot, and the index is addressed by that position. Removing a child
+moves the last child into its slot, so slots stay dense.
+
+- SegmentIndex works for any associative and commutative fn and costs
+  O(log degree) per change.
+- InverseIndex needs an inverse for fn (e.g. subtraction for addition, xor
+  for xor) and costs O(1) per change.
+
+total() returns None while the node has no children, or the identity of
+fn if one is given (see aggregators.py), in which case the padding and
+bookkeeping need no checks for missing values.
+"""
+
+
+class SegmentIndex:
+    """
+    Segment tree over the subtree values of a node's children.
+    - append(value): adds a value for a new last child.
+    - replace(slot, old, new): changes the value stored for a child.
+    - pop(value): drops the value of the last child.
+    - rebuild(values): rebuilds the index from scratch.
+    - total(): the aggregate of all values, None if empty.
+    """
+
+    def __init__(self, fn, values=(), identity=None):
+        """
+        :param fn: The aggregating function.
+        :param values: Initial values, in slot order.
+        :param identity: The identity of fn, None if unknown.
+        """
+        self.fn = fn
+        self.identity = identity
+        if identity is not None:
+            # padding is the identity, so combining needs no checks
+            self._combine = fn
+        self.rebuild(values)
+
+    def _combine(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return self.fn(a, b)
+
+    def rebuild(self, values):
+        """
+        Rebuilds the tree over the given values in O(len(values)).
+        :param values: Values, in slot order.
+        """
+        values = list(values)
+        self.size = len(values)
+
+        capacity = 1
+        while capacity < self.size:
+            capacity *= 2
+        self.capacity = capacity
+
+        # leaves live at [capacity, 2 * capacity), internal node i covers
+        # the leaves of 2i and 2i + 1
+        pad = self.identity
+        self.nodes = [pad] * capacity + values + [pad] * (capacity - self.size)
+        for i in range(capacity - 1, 0, -1):
+            self.nodes[i] = self._combine(self.nodes[2 * i], self.nodes[2 * i + 1])
+
+    def _set(self, slot, value):
+        i = slot + self.capacity
+        self.nodes[i] = value
+        i //= 2
+        while i >= 1:
+            self.nodes[i] = self._combine(self.nodes[2 * i], self.nodes[2 * i + 1])
+            i //= 2
+
+    def append(self, value):
+        """
+        Adds the value of a new last child.
+        :param value: The subtree value of the child.
+        """
+        if self.size == self.capacity:
+            self.rebuild(self.nodes[self.capacity:self.capacity + self.size] + [value])
+            return
+
+        self.size += 1
+        self._set(self.size - 1, value)
+
+    def replace(self, slot, old, new):
+        """
+        Changes the value stored for the child at slot.
+        :param slot: The position of the child.
+        :param old: The previous value (unused, kept for a common interface).
+        :param new: The new value.
+        """
+        self._set(slot, new)
+
+    def pop(self, value):
+        """
+        Drops the value of the last child.
+        :param value: The value stored for the last child (unused).
+        """
+        self.size -= 1
+        self._set(self.size, self.identity)
+
+    def total(self):
+        """
+        :return: The aggregate of all stored values, None if empty.
+        """
+        return self.nodes[1]
+
+
+class InverseIndex:
+    """
+    Running aggregate for functions with a registered inverse, where
+    inverse(fn(a, b), b) == a.
+    """
+
+    def __init__(self, fn, inverse, values=(), identity=None):
+        """
+        :param fn: The aggregating function.
+        :param inverse: The inverse of fn.
+        :param values: Initial values.
+        :param identity: The identity of fn, None if unknown.
+        """
+        self.fn = fn
+        self.inverse = inverse
+        self.identity = identity
+        self.rebuild(values)
+
+    def rebuild(self, values):
+        """
+        Refolds the running aggregate from scratch.
+        :param values: All stored values.
+        """
+        self.size = 0
+        self.value = self.identity
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        """
+        Adds the value of a new last child.
+        :param value: The subtree value of the child.
+        """
+        self.size += 1
+        self.value = value if self.value is None else self.fn(self.value, value)
+
+    def replace(self, slot, old, new):
+        """
+        Swaps old out of the running aggregate and new in.
+        :param slot: The position of the child (unused).
+        :param old: The previous value.
+        :param new: The new value.
+        """
+        self.value = self.fn(self.inverse(self.value, old), new)
+
+    def pop(self, value):
+        """
+        Takes the value of the last child out of the running aggregate.
+        :param value: The value stored for the last child.
+        """
+        self.size -= 1
+        if self.size == 0:
+            self.value = self.identity
+        else:
+            self.value = self.inverse(self.value, value)
+
+    def total(self):
+        """
+        :return: The running aggregate, None if empty.
+        """
+        return self.value
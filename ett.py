@@ -0,0 +1,339 @@
+"""
+Euler Tour Tree
+---------------
+
+An alternative backend for tree.Tree, selected with
+Tree(fn, backend="euler"), for trees whose height can degenerate to the
+number of nodes.
+
+The tree is kept as its Euler tour: every node contributes an enter token,
+holding its key, and an exit token, holding nothing. The tokens of a subtree
+form one contiguous run, from the node's enter token to its exit token. The
+tour is stored in a splay tree where every token also keeps the aggregate of
+its splay subtree, so
+
+- put (link) inserts the child's run just before the parent's exit token,
+- detaching a child (cut) splits its run out,
+- subtree_value is the aggregate of the node's run,
+
+each in amortised O(log n) time, whatever the height of the tree. This
+works for any associative and commutative fn.
+
+Tokens also count the enter tokens and sum +1 per enter and -1 per exit
+token below them, along with the highest prefix of that sum. The first
+gives subtree_size the same way as subtree_value, the last the exact
+height of the whole tree.
+
+Nodes are node.Node handles with one more slot for their two tokens. Their
+subtree_value is computed on every read instead of being stored, and the
+node.children lists are kept up to date so traversals and flatten work as
+before.
+"""
+
+import aggregators
+import node
+import tree
+
+
+class _Token:
+    """
+    An entry of the Euler tour, and a node of the splay tree over it.
+    """
+
+    __slots__ = ("left", "right", "up", "value", "agg", "size", "depth",
+                 "peak")
+
+    def __init__(self, value):
+        """
+        :param value: The key of the node for an enter token, None for an
+        exit token.
+        """
+        self.left = None
+        self.right = None
+        self.up = None
+        self.value = value
+        self.agg = value
+
+        # enter tokens, +1/-1 balance and its highest prefix in the splay
+        # subtree, see _pull
+        step = -1 if value is None else 1
+        self.size = 1 if step > 0 else 0
+        self.depth = step
+        self.peak = step
+
+
+class EulerTourTree(tree.Tree):
+    def __init__(self, fn, backend="euler", sizes=False, ids=False):
+        """
+        :param fn: The aggregating function.
+        :param backend: Always "euler", accepted so Tree(fn, backend="euler")
+        can construct this class.
+        :param sizes: As for Tree; sizes are read from the tour, so they
+        cost no walk up the ancestors.
+        :param ids: As for Tree.
+        """
+        super().__init__(fn, child_index=None, sizes=sizes, ids=ids)
+
+        # nodes compute their value on read like those of lazy trees, and
+        # keep their two tokens
+        self._node_class = node.node_class(sizes, True, ids, ("_tour",))
+
+        # subtree values are never stored, so there is nothing to absorb
+        self._absorbs = False
+
+    def height(self):
+        """
+        The exact number of edges on the longest path down from the root,
+        the highest balance of enter over exit tokens in the tour.
+        Needs sizes=True, as for Tree.
+        :return: The height, 0 for an empty tree or a lone root.
+        """
+        self._need_sizes()
+        if self.root is None:
+            return 0
+        t = self.root._tour[0]
+        while t.up is not None:
+            t = t.up
+        return t.peak - 1
+
+    def new_node(self, key, id=None):
+        if self.names is not None:
+            key = self._key(key)
+        n = self._node_class(key)
+        if id is not None:
+            self._register(n, id)
+
+        # the subtree value is never cached, reading it always asks the tree
+        n._dirty = True
+        n._tree = self
+
+        enter = _Token(key)
+        exit = _Token(None)
+        enter.right = exit
+        exit.up = enter
+        n._tour = (enter, exit)
+        return n
+
+    def flatten(self, node, fn):
+        if node.is_external():
+            return node
+
+        if isinstance(fn, dict):
+            fn = aggregators.fuse(fn)
+        result = tree.reduce_keys(fn, self._subtree_keys(node))
+        return self._flatten_to(node, result)
+
+    def _flatten_to(self, node, result):
+        if self._named:
+            self._forget(node)
+        if self._lifts:
+            self._unlift(node)
+
+        # every child takes its run of the tour with it
+        for c in list(node.children):
+            self._detach(node, c)
+
+        enter = node._tour[0]
+        self._splay(enter)
+        enter.value = result
+        self._pull(enter)
+
+        node.key = result
+        self.last_touched = 0
+        return node
+
+    def swap(self, node_a, node_b):
+        if node_a == node_b:
+            self.last_touched = 0
+            return
+
+        self._cut(node_a)
+        self._cut(node_b)
+        super().swap(node_a, node_b)
+        self._link(node_a.parent, node_a)
+        self._link(node_b.parent, node_b)
+
+    def enable_journal(self, limit=None):
+        raise ValueError("Euler tour trees have no journal")
+
+    def update_subtree(self, node):
+        """
+        Subtree values are computed on read, so there is nothing to refold.
+        :param node: Unused.
+        :return: 0
+        """
+        return 0
+
+    def parallel_refold(self, workers=None):
+        """
+        Subtree values are computed on read, so there is nothing to refold.
+        :param workers: Unused.
+        """
+
+    def _changed(self, x, y=None):
+        return 0
+
+    def _resize(self, node, size, height=-1):
+        # sizes are read from the tour like subtree values
+        pass
+
+    def _refresh(self, node):
+        enter, exit = node._tour
+        left, middle = self._split_before(enter)
+        middle, right = self._split_after(exit)
+        node.subtree_value = middle.agg
+        if self.sizes:
+            node._size = middle.size
+        self._merge(self._merge(left, middle), right)
+
+    def _bulk_fold(self, order):
+        # lay out the tour of the freshly linked tree and build a balanced
+        # splay tree over it in O(N)
+        tokens = []
+        stack = [(order[0], False)]
+        while stack:
+            n, leaving = stack.pop()
+            if leaving:
+                tokens.append(n._tour[1])
+                continue
+            tokens.append(n._tour[0])
+            stack.append((n, True))
+            for c in reversed(n.children):
+                stack.append((c, False))
+
+        for t in tokens:
+            t.left = t.right = t.up = None
+        self._build(tokens, 0, len(tokens))
+
+    def _bulk_trust(self, order):
+        # subtree values are never stored, the tour is all there is to build
+        self._bulk_fold(order)
+
+    def _build(self, tokens, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        t = tokens[mid]
+        t.left = self._build(tokens, lo, mid)
+        t.right = self._build(tokens, mid + 1, hi)
+        if t.left is not None:
+            t.left.up = t
+        if t.right is not None:
+            t.right.up = t
+        self._pull(t)
+        return t
+
+    def _attach(self, parent, child):
+        super()._attach(parent, child)
+        self._link(parent, child)
+
+    def _detach(self, parent, child):
+        super()._detach(parent, child)
+        self._cut(child)
+
+    def _link(self, parent, child):
+        # child is the root of its own tour, insert it before parent's exit
+        run = self._splay(child._tour[0])
+        left, right = self._split_before(parent._tour[1])
+        self._merge(self._merge(left, run), right)
+
+    def _cut(self, child):
+        enter, exit = child._tour
+        left, middle = self._split_before(enter)
+        middle, right = self._split_after(exit)
+        self._merge(left, right)
+
+    def _pull(self, t):
+        agg = t.value
+        step = -1 if agg is None else 1
+        size = 1 if step > 0 else 0
+        depth = step
+        peak = step
+        left = t.left
+        right = t.right
+        if left is not None:
+            if left.agg is not None:
+                agg = left.agg if agg is None else self.fn(left.agg, agg)
+            size += left.size
+            peak = max(left.peak, left.depth + step)
+            depth += left.depth
+        if right is not None:
+            if right.agg is not None:
+                agg = right.agg if agg is None else self.fn(agg, right.agg)
+            size += right.size
+            peak = max(peak, depth + right.peak)
+            depth += right.depth
+        t.agg = agg
+        t.size = size
+        t.depth = depth
+        t.peak = peak
+
+    def _rotate(self, x):
+        p = x.up
+        g = p.up
+        if p.left is x:
+            p.left = x.right
+            if x.right is not None:
+                x.right.up = p
+            x.right = p
+        else:
+            p.right = x.left
+            if x.left is not None:
+                x.left.up = p
+            x.left = p
+        p.up = x
+        x.up = g
+        if g is not None:
+            if g.left is p:
+                g.left = x
+            else:
+                g.right = x
+        self._pull(p)
+        self._pull(x)
+
+    def _splay(self, x):
+        while x.up is not None:
+            p = x.up
+            g = p.up
+            if g is not None:
+                if (g.left is p) == (p.left is x):
+                    self._rotate(p)
+                else:
+                    self._rotate(x)
+            self._rotate(x)
+        return x
+
+    def _split_before(self, t):
+        # (tokens before t, tokens from t on)
+        self._splay(t)
+        left = t.left
+        if left is not None:
+            left.up = None
+            t.left = None
+            self._pull(t)
+        return left, t
+
+    def _split_after(self, t):
+        # (tokens up to t, tokens after t)
+        self._splay(t)
+        right = t.right
+        if right is not None:
+            right.up = None
+            t.right = None
+            self._pull(t)
+        return t, right
+
+    def _merge(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+
+        last = a
+        while last.right is not None:
+            last = last.right
+        self._splay(last)
+        last.right = b
+        b.up = last
+        self._pull(last)
+        return last
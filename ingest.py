@@ -0,0 +1,184 @@
+"""
+Streaming Ingestion
+-------------------
+
+Builds a tree.Tree from a stream of (parent_id, child_id, key) records,
+for trees delivered as files too large to hold as Python dicts of records.
+
+Records are consumed in chunks and linked as they arrive. A child that
+arrives before its parent waits in an orphan buffer, keyed by the missing
+parent id, until the parent shows up. Subtree values are only computed
+once, in a single bottom-up pass after the last record, so the cost of
+ingestion is O(N) whatever the order of the records.
+
+Sources can be any iterable of records, or a path to
+
+- a JSON lines file (.jsonl or .json): one [parent_id, child_id, key] list
+  or {"parent": ..., "id": ..., "key": ...} object per line, with a null
+  parent for the root.
+- an edge list (any other extension): one "parent_id child_id key" line per
+  record, separated by whitespace or commas, with a parent of "-" for the
+  root. Ids are kept as strings and keys parsed as integers.
+
+Apart from the tree itself, memory holds the map from ids to nodes, the
+orphans waiting for their parent and one chunk of records. With ids=True
+the nodes also stay registered under their ids for tree.get().
+
+With pause_gc=True the cycle collector is switched off while records are
+linked, which saves it rescanning the growing tree again and again. The
+switch is process-wide, so other threads collect no cycles meanwhile.
+Overlapping ingestions that pause it keep it off until the last of them
+is done, and then restore what it was before the first.
+"""
+
+import contextlib
+import gc
+import itertools
+import json
+import os
+import threading
+
+CHUNK_SIZE = 1 << 16
+
+# ingestions running with pause_gc, and whether the collector was enabled
+# before the first of them
+_pausing = 0
+_was_enabled = False
+_pause_lock = threading.Lock()
+
+
+def ingest(cls, source, fn, chunk_size=CHUNK_SIZE, ids=False, pause_gc=False,
+           **kwargs):
+    """
+    Builds a tree from (parent_id, child_id, key) records.
+    :param cls: The tree class to build, tree.Tree or a subclass.
+    :param source: An iterable of records or the path of a JSON lines or
+    edge list file.
+    :param fn: The aggregating function.
+    :param chunk_size: The number of records read at a time.
+    :param ids: If True, register every node under its child_id in the
+    tree's id registry.
+    :param pause_gc: If True, switch the cycle collector off while linking.
+    :param kwargs: Passed on to the constructor.
+    :return: The new tree.
+    """
+    if ids:
+        kwargs["ids"] = True
+    tree = cls(fn, **kwargs)
+
+    paused = _gc_paused() if pause_gc else contextlib.nullcontext()
+    with paused:
+        if isinstance(source, (str, bytes, os.PathLike)):
+            with open(source) as f:
+                _link_records(tree, _parse(f, _is_json(source)), chunk_size,
+                              ids)
+        else:
+            _link_records(tree, iter(source), chunk_size, ids)
+
+    return tree
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # the cycle collector would otherwise rescan the growing tree again and
+    # again while millions of nodes are allocated, and nothing created here
+    # is garbage until ingestion fails
+    global _pausing, _was_enabled
+    with _pause_lock:
+        if not _pausing:
+            _was_enabled = gc.isenabled()
+            gc.disable()
+        _pausing += 1
+    try:
+        yield
+    finally:
+        with _pause_lock:
+            _pausing -= 1
+            if not _pausing and _was_enabled:
+                gc.enable()
+
+
+def _is_json(path):
+    return os.path.splitext(os.fsdecode(path))[1] in (".jsonl", ".json")
+
+
+def _parse(lines, is_json):
+    # turn the lines of a file into (parent_id, child_id, key) records
+    if is_json:
+        loads = json.loads
+        for line in lines:
+            if not line.strip():
+                continue
+            record = loads(line)
+            if isinstance(record, dict):
+                yield record.get("parent"), record["id"], record["key"]
+            else:
+                yield record
+        return
+
+    for line in lines:
+        fields = line.replace(",", " ").split()
+        if not fields:
+            continue
+        parent, child, key = fields
+        yield None if parent == "-" else parent, child, int(key)
+
+
+def _link_records(tree, records, chunk_size, ids=False):
+    nodes = {}
+    orphans = {}
+    new_node = tree.new_node
+    root = None
+
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+
+        for parent_id, child_id, key in chunk:
+            if child_id in nodes:
+                raise ValueError("duplicate node id {!r}".format(child_id))
+            child = new_node(key, child_id) if ids else new_node(key)
+            nodes[child_id] = child
+
+            # children that arrived first
+            waiting = orphans.pop(child_id, None)
+            if waiting is not None:
+                children = child.children
+                for slot, c in enumerate(waiting):
+                    c.parent = child
+                    c.slot = slot
+                children.extend(waiting)
+
+            if parent_id is None:
+                if root is not None:
+                    raise ValueError("more than one root")
+                root = child
+                continue
+
+            parent = nodes.get(parent_id)
+            if parent is None:
+                orphans.setdefault(parent_id, []).append(child)
+            else:
+                child.parent = parent
+                child.slot = len(parent.children)
+                parent.children.append(child)
+
+    if orphans:
+        missing = next(iter(orphans))
+        raise ValueError("parent {!r} never arrived".format(missing))
+    if root is None:
+        raise ValueError("no root record")
+
+    # the ids are no longer needed, free them before the final pass
+    count = len(nodes)
+    nodes = None
+
+    order = [root]
+    for n in order:
+        order.extend(n.children)
+    if len(order) != count:
+        raise ValueError("records do not describe a single tree")
+
+    tree.root = root
+    tree._bulk_fold(order)
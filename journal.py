@@ -0,0 +1,152 @@
+"""
+Operation Journal
+-----------------
+
+An undo log for tree.Tree, switched on with tree.enable_journal() or the
+first tree.checkpoint().
+
+While it is on, put, swap and flatten each append the little it takes to
+invert them:
+
+- put: the child, its old parent and its old slot there,
+- swap: the two nodes, swapping them again undoes it,
+- flatten: the node, its old key, its old children list and child index.
+  The cut off subtrees are left untouched by flatten, so they only need to
+  be linked back in. The child index is rebuilt over them on undo, since
+  their values may have been refolded while they were cut off.
+
+tree.rollback(to=checkpoint) undoes entries newest first until the journal
+is back at the checkpoint, so it costs time in proportion to the changes
+made since, whatever the size of the tree.
+
+The journal holds at most limit entries, dropping the oldest ones, and
+truncate() drops entries explicitly. Checkpoints older than the oldest
+entry left can no longer be rolled back to. Note that the entries of
+flatten keep the cut off subtrees alive until they are dropped.
+"""
+
+from collections import deque
+
+
+class Journal:
+    """
+    The entries recorded for one tree, oldest first.
+    """
+
+    def __init__(self, limit=None):
+        """
+        :param limit: The most entries to keep, None for no limit.
+        """
+        self.entries = deque(maxlen=limit)
+
+        # entries ever recorded, checkpoints are positions in this count
+        self.count = 0
+
+    def append(self, entry):
+        self.entries.append(entry)
+        self.count += 1
+
+    def oldest(self):
+        """
+        :return: The oldest checkpoint that can still be rolled back to.
+        """
+        return self.count - len(self.entries)
+
+    def truncate(self, before=None):
+        """
+        Drops the entries older than a checkpoint, all of them by default.
+        :param before: The checkpoint.
+        """
+        if before is None:
+            before = self.count
+        while self.entries and self.oldest() < before:
+            self.entries.popleft()
+
+
+def rollback(tree, journal, to):
+    """
+    Undoes journaled operations newest first until the journal is back at
+    checkpoint to.
+    :param tree: The tree.Tree the journal belongs to.
+    :param journal: Its Journal.
+    :param to: The checkpoint.
+    :return: The number of nodes refolded.
+    """
+    if to < journal.oldest():
+        raise ValueError("checkpoint {} is no longer in the journal".format(to))
+    if to > journal.count:
+        raise ValueError("checkpoint {} is in the future".format(to))
+
+    # persistent trees keep versions of the nodes undo touches
+    recorded = getattr(tree, "_recorded", None)
+
+    touched = 0
+    while journal.count > to:
+        entry = journal.entries.pop()
+        journal.count -= 1
+        nodes = _UNDO[entry[0]](tree, *entry[1:])
+        touched += tree.last_touched
+        if recorded is not None and nodes:
+            recorded(*nodes)
+    return touched
+
+
+def _undo_put(tree, child, old_parent, old_slot):
+    parent = child.parent
+    tree._walked = 0
+    tree._detach(parent, child)
+    if old_parent is not None:
+        tree._reinsert(old_parent, child, old_slot)
+    tree.last_touched = max(tree._changed(parent, old_parent), tree._walked)
+    return parent, old_parent
+
+
+def _undo_swap(tree, node_a, node_b):
+    # swap records its own versions in persistent trees
+    tree.swap(node_a, node_b)
+    return ()
+
+
+def _undo_flatten(tree, node, key, children, child_index):
+    if tree.sizes:
+        size = 1 + sum(c.subtree_size for c in children)
+        height = 1 + max(c._height for c in children)
+        grown = size - node.subtree_size
+
+    for slot, c in enumerate(children):
+        c.parent = node
+        c.slot = slot
+    node.children = children
+
+    # the saved index may have missed refolds of the children that ran
+    # while they were cut off, e.g. when batch() flushed after flatten,
+    # so it is rebuilt from their current values
+    if child_index is not None:
+        child_index = tree._new_index(c.subtree_value for c in children)
+    node.child_index = child_index
+    node.key = key
+    if tree._named:
+        tree._remember(node)
+    tree._walked = 0
+    if tree.sizes:
+        node._size = size
+        node._height = height
+        if node.parent is not None:
+            tree._resize(node.parent, grown, height)
+
+    # the subtrees moved back in, so lifting tables below are stale
+    tree._moved()
+
+    # refold from node itself, in lazy trees this also lets a refresh
+    # reach children that were dirty when they were cut off
+    if node._dirty:
+        node._dirty = False
+    tree.last_touched = max(tree._changed(node), tree._walked)
+    return (node,)
+
+
+_UNDO = {
+    "put": _undo_put,
+    "swap": _undo_swap,
+    "flatten": _undo_flatten,
+}
@@ -0,0 +1,268 @@
+"""
+Thread-Safe Tree
+----------------
+
+A tree.Tree that can be shared by threads, selected with
+Tree(fn, threadsafe=True).
+
+Nodes are guarded by a fixed pool of striped locks, a node using the stripe
+its hash falls into, so the locks cost nothing per node.
+
+- put, swap, flatten and parallel_flatten take the stripes of the parents whose children they
+  change, in stripe order, relink, and let go again.
+- parallel_refold rewrites every node, so it waits for running operations
+  and consistent() readers to finish and holds new ones back until it is
+  done.
+- The refold that follows walks up one node at a time, holding only the
+  stripe of the node it is refolding while it folds and stores it. Subtree
+  sizes are brought up to date the same way just before.
+
+A thread never waits for a stripe while holding another one it did not
+take in order, so there are no deadlocks, and writers in disjoint subtrees
+only meet where their paths do. Since every refold of a node reads the
+latest values of its children, the last one to run leaves it correct
+whatever order concurrent writers got there in.
+
+Readers that need values from a single point in time, e.g. several nodes
+at once, use
+
+    with tree.consistent():
+        ...
+
+which waits for running operations to finish and holds new ones back until
+the block exits.
+
+Child indexes, lazy mode, batch() and the journal keep state shared by all
+children of a node or by the whole tree, so they are not available on
+thread-safe trees.
+last_touched reports the operation that finished last, in any thread.
+"""
+
+import contextlib
+import threading
+
+import tree
+
+
+class ThreadSafeTree(tree.Tree):
+    def __init__(self, fn, child_index=None, inverse=None, lazy=False,
+                 backend=None, threadsafe=True, sizes=False, ids=False,
+                 stripes=64):
+        """
+        :param fn: The aggregating function.
+        :param child_index: "auto" or None, there are no child indexes.
+        :param inverse: Unused, accepted for the same signature as Tree.
+        :param lazy: Must be False.
+        :param backend: Must be None.
+        :param threadsafe: Always True, accepted so
+        Tree(fn, threadsafe=True) can construct this class.
+        :param sizes: As for Tree.
+        :param ids: As for Tree.
+        :param stripes: The number of locks guarding the nodes.
+        """
+        if child_index not in ("auto", None):
+            raise ValueError("thread-safe trees have no child indexes")
+        if lazy:
+            raise ValueError("thread-safe trees cannot be lazy")
+        if backend is not None:
+            raise ValueError("thread-safe trees have no other backends")
+
+        super().__init__(fn, child_index=None, inverse=inverse, sizes=sizes,
+                         ids=ids)
+
+        # absorbing reads and writes each ancestor without its lock
+        self._absorbs = False
+
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+        # running operations and readers waiting for or holding a
+        # consistent() view
+        self._gate = threading.Condition()
+        self._writers = 0
+        self._readers = 0
+        self._waiting = 0
+
+        # the nodes the current thread's operation still has to refold
+        self._pending = threading.local()
+
+    # each operation reads the parents it has to lock before locking them,
+    # and tries again if another thread moved a node in between
+
+    def put(self, parent, child):
+        with self._writing():
+            while True:
+                old_parent = child.parent
+                with self._holding(parent, old_parent):
+                    if child.parent is old_parent:
+                        super().put(parent, child)
+                        break
+            self.last_touched = self._refold_pending()
+
+    def flatten(self, node, fn):
+        with self._writing():
+            while True:
+                parent = node.parent
+                with self._holding(node, parent):
+                    if node.parent is parent:
+                        super().flatten(node, fn)
+                        break
+            self.last_touched = self._refold_pending()
+        return node
+
+    def parallel_flatten(self, node, fn, workers=None):
+        with self._writing():
+            while True:
+                parent = node.parent
+                with self._holding(node, parent):
+                    if node.parent is parent:
+                        super().parallel_flatten(node, fn, workers)
+                        break
+            self.last_touched = self._refold_pending()
+        return node
+
+    def parallel_refold(self, workers=None):
+        """
+        Tree.parallel_refold, run while no other operation or consistent()
+        block is.
+        :param workers: The number of processes, os.cpu_count() by default.
+        """
+        with self._gate:
+            # waits like a consistent() reader, but for readers too
+            self._waiting += 1
+            while self._writers or self._readers:
+                self._gate.wait()
+            self._waiting -= 1
+            super().parallel_refold(workers)
+            # writers that saw it waiting are asleep until told
+            self._gate.notify_all()
+
+    def swap(self, node_a, node_b):
+        with self._writing():
+            while True:
+                a_parent = node_a.parent
+                b_parent = node_b.parent
+                with self._holding(a_parent, b_parent):
+                    if node_a.parent is a_parent and node_b.parent is b_parent:
+                        super().swap(node_a, node_b)
+                        break
+            self.last_touched = self._refold_pending()
+
+    def batch(self):
+        raise ValueError("batch() is not available on thread-safe trees")
+
+    def enable_journal(self, limit=None):
+        raise ValueError("thread-safe trees have no journal")
+
+    @contextlib.contextmanager
+    def consistent(self):
+        """
+        Waits for running put, swap and flatten calls to finish and holds
+        new ones back until the block exits, so every subtree_value read
+        inside it belongs to the same state of the tree.
+        """
+        with self._gate:
+            self._waiting += 1
+            while self._writers:
+                self._gate.wait()
+            self._waiting -= 1
+            self._readers += 1
+        try:
+            yield self
+        finally:
+            with self._gate:
+                self._readers -= 1
+                if not self._readers:
+                    self._gate.notify_all()
+
+    def update_subtree(self, node):
+        """
+        Refolds node and its ancestors like Tree.update_subtree, holding
+        the stripe of each node while it is folded and stored.
+        :param node: The lowest node whose children changed.
+        :return: The number of nodes that were refolded.
+        """
+        touched = 0
+
+        while node is not None:
+            touched += 1
+            with self._lock(node):
+                value = self._fold(node)
+                if value == node.subtree_value:
+                    break
+                node.subtree_value = value
+                parent = node.parent
+            node = parent
+
+        return touched
+
+    def _changed(self, x, y=None):
+        # refolding waits until the structural locks are released
+        self._pending.nodes = (x, y)
+        return 0
+
+    def _resize(self, node, size, height=-1):
+        # so do size changes, which walk up the same way
+        resized = getattr(self._pending, "resized", None)
+        if resized is None:
+            resized = self._pending.resized = []
+        resized.append((node, size, height))
+
+    def _refold_pending(self):
+        x, y = getattr(self._pending, "nodes", (None, None))
+        self._pending.nodes = (None, None)
+
+        # sizes first, holding the stripe of each node while it changes
+        walked = 0
+        for node, size, height in getattr(self._pending, "resized", ()):
+            while node is not None:
+                height += 1
+                with self._lock(node):
+                    if not size and height <= node._height:
+                        break
+                    node._size += size
+                    if height > node._height:
+                        node._height = height
+                    parent = node.parent
+                walked += 1
+                node = parent
+        self._pending.resized = []
+
+        touched = 0
+        if x is not None:
+            touched += self.update_subtree(x)
+        if y is not None:
+            touched += self.update_subtree(y)
+        return max(touched, walked)
+
+    def _lock(self, node):
+        return self._locks[hash(node) % len(self._locks)]
+
+    @contextlib.contextmanager
+    def _holding(self, *nodes):
+        # the stripes of the given nodes, taken in stripe order so two
+        # threads can never wait for each other
+        locks = sorted({id(self._lock(n)): self._lock(n)
+                        for n in nodes if n is not None}.items())
+        for _, lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for _, lock in reversed(locks):
+                lock.release()
+
+    @contextlib.contextmanager
+    def _writing(self):
+        # writers run side by side, but wait for consistent() readers,
+        # which go first as soon as they ask
+        with self._gate:
+            while self._readers or self._waiting:
+                self._gate.wait()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._writers -= 1
+                if not self._writers:
+                    self._gate.notify_all()
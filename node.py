@@ -15,6 +15,8 @@ in the above formula yields the same result.
 If this node has no children, then subtree_value = self.key.
 """
 
+import traversal
+
 
 class Node:
     """
@@ -23,8 +25,24 @@ class Node:
     subtree.
     - is_external(): Checks if the node is a leaf.
     - children(): returns the list of children.
+    - subtree_value: the aggregate of the subtree. In lazy trees it is
+    recomputed on first read once the tree has marked the node dirty.
+    - agg: the same, named for multi-aggregate trees, node.agg["max"].
+    - id: the external id given to Tree.new_node, None by default.
+
+    Trees make their nodes through node_class(), which adds the fields of
+    the features they use to this class.
     """
 
+    # no per-instance __dict__, which matters once trees hold millions of
+    # nodes; see arraytree.py for an even more compact layout
+    __slots__ = ("key", "parent", "subtree_value", "children", "slot",
+                 "child_index")
+
+    # what nodes without the slots of node_class() read for these
+    id = None
+    _dirty = False
+
     def __init__(self, key, parent=None):
         """
         The initialisation of the node sets the key and instantiates the
@@ -34,9 +52,51 @@ class Node:
         """
         self.key = key
         self.parent = parent
-        self.subtree_value = key
         self.children = []
+        self.subtree_value = key
+
+        # position of this node in parent.children
+        self.slot = None
+
+        # optional aggregate over the children's subtree values, see
+        # childindex.py
+        self.child_index = None
+
+    @property
+    def agg(self):
+        """
+        The subtree aggregates of a multi-aggregate tree, by name, e.g.
+        node.agg["max"]. The same as subtree_value.
+        """
+        return self.subtree_value
+
+    def iter_preorder(self, prune=None):
+        """
+        Iterates over the subtree rooted at this node, each node before its
+        children, without recursion. See traversal.py.
+        :param prune: Optional predicate on subtree_value, nodes for which
+        it is true are skipped with their whole subtree.
+        :return: Iterator over the nodes.
+        """
+        return traversal.preorder(self, prune)
+
+    def iter_postorder(self, prune=None):
+        """
+        Like iter_preorder, but each node comes after its children.
+        """
+        return traversal.postorder(self, prune)
 
+    def iter_levelorder(self, prune=None):
+        """
+        Like iter_preorder, but level by level from this node down.
+        """
+        return traversal.levelorder(self, prune)
+
+    def iter_leaves(self, prune=None):
+        """
+        Like iter_preorder, but only yields the leaves.
+        """
+        return traversal.leaves(self, prune)
 
     def is_external(self):
         """
@@ -56,3 +116,126 @@ class Node:
         # this here for ease of use and standard usage things
         # for other languages people might be used to.
         return self.children
+
+
+class SizedNode(Node):
+    """
+    A Node that also counts its subtree, made by trees built with
+    Tree(fn, sizes=True).
+    - subtree_size: the number of nodes in the subtree.
+    """
+
+    __slots__ = ("_size", "_height", "_grown")
+
+    def __init__(self, key, parent=None):
+        """
+        :param key: The value of the node.
+        :param parent: The parent of the node.
+        """
+        super().__init__(key, parent)
+
+        # number of nodes in the subtree and an upper bound on its height,
+        # kept by the tree; _grown is a size change below this node that a
+        # lazy tree has not folded in yet
+        self._size = 1
+        self._height = 0
+        self._grown = 0
+
+    @property
+    def subtree_size(self):
+        """
+        The number of nodes in the subtree rooted at this node.
+        """
+        return self._size
+
+
+# the subtree_value slot itself, behind the property of lazy nodes
+_value = Node.subtree_value
+
+
+class _Lazy:
+    # nodes of lazy trees: set by the tree when the cached value is stale,
+    # _tree is the tree that knows how to recompute it
+
+    __slots__ = ()
+
+    def __init__(self, key, parent=None):
+        super().__init__(key, parent)
+        self._dirty = False
+        self._tree = None
+
+    @property
+    def subtree_value(self):
+        """
+        The aggregate of the keys in the subtree rooted at this node.
+        """
+        if self._dirty:
+            self._tree._refresh(self)
+        return _value.__get__(self)
+
+    @subtree_value.setter
+    def subtree_value(self, value):
+        _value.__set__(self, value)
+
+
+class _LazySized(_Lazy):
+    # the same for trees that also count subtrees
+
+    __slots__ = ()
+
+    @property
+    def subtree_size(self):
+        """
+        The number of nodes in the subtree rooted at this node.
+        """
+        if self._dirty:
+            self._tree._refresh(self)
+        return self._size
+
+
+class _Named:
+    # nodes of trees with an id registry, which holds them weakly
+
+    __slots__ = ()
+
+    def __init__(self, key, parent=None):
+        super().__init__(key, parent)
+        self.id = None
+
+
+_classes = {}
+
+
+def node_class(sizes=False, lazy=False, ids=False, slots=()):
+    """
+    The class of the nodes of a tree, which has slots only for the
+    features the tree uses. Classes are made once per combination.
+    :param sizes: True for subtree sizes, a SizedNode.
+    :param lazy: True for the dirty flag of lazy trees.
+    :param ids: True for an id and the weak reference the registry needs.
+    :param slots: Further slots a backend keeps on its nodes.
+    :return: Node, SizedNode or a subclass of them.
+    """
+    spec = (sizes, lazy, ids, tuple(slots))
+    cls = _classes.get(spec)
+    if cls is not None:
+        return cls
+
+    base = SizedNode if sizes else Node
+    mixins = []
+    extra = list(slots)
+    if lazy:
+        mixins.append(_LazySized if sizes else _Lazy)
+        extra += ["_dirty", "_tree"]
+    if ids:
+        mixins.append(_Named)
+        extra += ["id", "__weakref__"]
+
+    cls = base
+    if extra:
+        name = ("Lazy" if lazy else "") + ("Named" if ids else "") + \
+            base.__name__
+        cls = type(name, tuple(mixins) + (base,),
+                   {"__slots__": tuple(extra), "__module__": __name__})
+    _classes[spec] = cls
+    return cls
@@ -0,0 +1,211 @@
+"""
+Parallel Aggregation
+--------------------
+
+Spreads the folding work for huge trees over a pool of worker processes,
+for Tree.parallel_refold() and Tree.parallel_flatten().
+
+The tree is laid out in preorder, where every subtree is one contiguous
+range, as two int64 columns in shared memory: the keys and the position of
+each node's parent. Workers attach to the shared memory by name, so the
+columns are never pickled.
+
+refold() counts subtree sizes and cuts the tree into the largest subtrees
+of at most about n / (4 * workers) nodes. Runs of adjacent ones are
+packed into tasks of roughly equal size. Each worker folds its ranges
+bottom up and sends back the subtree values. The nodes above the cut, the
+skeleton, are then folded in this process from those values.
+
+reduce_keys() splits the keys into one chunk per task, and the partial
+results are combined here.
+
+Both work for any picklable fn that is associative and commutative. Keys
+must be integers that fit in 64 bits, as in snapshot.py. Laying out the
+columns and setting the results on the nodes stays in this process, so the
+pool only pays off when fn is expensive enough to outweigh it; see the
+README for measured scaling.
+"""
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import tree as _tree
+
+# tasks per worker, so a slow task does not leave the others idle
+TASKS_PER_WORKER = 4
+
+
+def refold(tree, workers=None):
+    """
+    Recomputes every subtree value of tree.
+    :param tree: The tree.Tree to refold.
+    :param workers: The number of processes, os.cpu_count() by default.
+    """
+    if tree.root is None:
+        return
+    workers = workers or os.cpu_count() or 1
+
+    order = _preorder(tree.root)
+    n = len(order)
+    position = {node: i for i, node in enumerate(order)}
+    parents = array("q", [-1] * n)
+    for i, node in enumerate(order):
+        if node.parent is not None:
+            parents[i] = position[node.parent]
+
+    # subtree sizes, children before parents
+    sizes = [1] * n
+    for i in range(n - 1, 0, -1):
+        sizes[parents[i]] += sizes[i]
+
+    # the largest subtrees of at most limit nodes, as preorder ranges
+    limit = max(1, n // (workers * TASKS_PER_WORKER))
+    ranges = []
+    i = 0
+    while i < n:
+        if sizes[i] <= limit:
+            ranges.append((i, i + sizes[i]))
+            i += sizes[i]
+        else:
+            i += 1
+
+    # pack adjacent ranges into tasks of about limit nodes
+    tasks = []
+    for lo, hi in ranges:
+        if tasks and tasks[-1][-1][1] == lo and \
+                hi - tasks[-1][0][0] <= limit:
+            tasks[-1].append((lo, hi))
+        else:
+            tasks.append([(lo, hi)])
+
+    # the unwrapped fn while stats are counting its calls, which pickles
+    fn = getattr(tree, "_raw_fn", tree.fn)
+    keys = _columns([node.key for node in order])
+    folded = bytearray(n)
+    with _shared(keys, parents) as name:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(_fold_ranges, name, n, fn, task)
+                       for task in tasks]
+            for task, future in zip(tasks, futures):
+                values = iter(future.result())
+                for lo, hi in task:
+                    for j in range(lo, hi):
+                        order[j].subtree_value = next(values)
+                        folded[j] = 1
+
+    # child indexes and the skeleton above the folded subtrees
+    for j in range(n - 1, -1, -1):
+        node = order[j]
+        if node._dirty:
+            if tree.sizes:
+                tree._settle(node)
+            node._dirty = False
+        if tree.child_index is not None and node.children:
+            node.child_index = tree._new_index(
+                c.subtree_value for c in node.children)
+        if not folded[j]:
+            node.subtree_value = tree._fold(node)
+
+
+def reduce_keys(fn, keys, workers=None):
+    """
+    Folds fn over a non-empty list of keys in a pool of processes.
+    :param fn: A picklable aggregating function.
+    :param keys: The keys.
+    :param workers: The number of processes, os.cpu_count() by default.
+    :return: The aggregate.
+    """
+    workers = workers or os.cpu_count() or 1
+    n = len(keys)
+    step = max(1, -(-n // (workers * TASKS_PER_WORKER)))
+
+    with _shared(_columns(keys)) as name:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(_reduce_range, name, n, fn, lo,
+                                   min(lo + step, n))
+                       for lo in range(0, n, step)]
+            partials = [future.result() for future in futures]
+
+    return _tree.reduce_keys(fn, partials)
+
+
+def _preorder(root):
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(node.children))
+    return order
+
+
+def _columns(keys):
+    try:
+        return array("q", keys)
+    except (TypeError, OverflowError):
+        raise ValueError("parallel folding needs 64 bit integer keys")
+
+
+class _shared:
+    # copies int64 columns back to back into a fresh shared memory block
+    # and yields its name, unlinking it on exit
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def __enter__(self):
+        size = sum(len(c) for c in self.columns) * 8
+        self.memory = shared_memory.SharedMemory(create=True,
+                                                 size=max(size, 8))
+        offset = 0
+        for column in self.columns:
+            data = column.tobytes()
+            self.memory.buf[offset:offset + len(data)] = data
+            offset += len(data)
+        return self.memory.name
+
+    def __exit__(self, *exc):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def _attach(name, n, count, lo, hi):
+    # entries lo to hi of each of the count int64 columns of n entries in
+    # the shared memory block name
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        with memory.buf[:count * n * 8].cast("q") as data:
+            return [data[i * n + lo:i * n + hi].tolist() for i in range(count)]
+    finally:
+        memory.close()
+
+
+def _fold_ranges(name, n, fn, ranges):
+    # worker: subtree values of whole subtrees given as preorder ranges
+    start = ranges[0][0]
+    keys, parents = _attach(name, n, 2, start, ranges[-1][1])
+    out = []
+    for lo, hi in ranges:
+        acc = [None] * (hi - lo)
+        values = [None] * (hi - lo)
+        for i in range(hi - 1, lo - 1, -1):
+            value = keys[i - start]
+            below = acc[i - lo]
+            if below is not None:
+                value = fn(value, below)
+            values[i - lo] = value
+
+            # the root of the range has its parent outside of it
+            p = parents[i - start] - lo
+            if p >= 0:
+                acc[p] = value if acc[p] is None else fn(acc[p], value)
+        out.extend(values)
+    return out
+
+
+def _reduce_range(name, n, fn, lo, hi):
+    # worker: fn folded over keys[lo:hi]
+    keys, = _attach(name, n, 1, lo, hi)
+    return _tree.reduce_keys(fn, keys)
@@ -0,0 +1,147 @@
+"""
+Persistent Tree
+---------------
+
+A tree.Tree that keeps point-in-time versions of itself, selected with
+Tree(fn, persistent=True).
+
+Next to the live nodes, every node points to an immutable Record of its
+key, subtree value and the records of its children. A mutation builds new
+records for the nodes it changed and for their ancestors, once each and
+children first, and shares the records of everything else with the
+versions before it (path copying). The cost per mutation is O(height) new
+records, plus copying the children tuple of each of them.
+
+snapshot() returns the current root record in O(1). It is a complete,
+read-only view of the tree at that moment that later mutations never
+change, and it is freed like any other object once nothing refers to it.
+Records have children and subtree_value like nodes, so traversal.py walks
+them as well:
+
+    version = t.snapshot()
+    for record in traversal.preorder(version):
+        ...
+
+Lazy mode and the Euler tour backend compute values on read, so they
+cannot be persistent. Calling update_subtree() directly does not record a
+version; use put, swap and flatten.
+"""
+
+import collections
+
+import node
+import tree
+
+Record = collections.namedtuple("Record", ("key", "subtree_value", "children"))
+Record.__doc__ = """
+An immutable version of a node: its key, subtree value and the tuple of
+its children's records.
+"""
+
+
+class PersistentTree(tree.Tree):
+    def __init__(self, fn, child_index=None, inverse=None, lazy=False,
+                 backend=None, persistent=True, sizes=False, ids=False):
+        """
+        :param fn: The aggregating function.
+        :param child_index: As for Tree.
+        :param inverse: As for Tree.
+        :param lazy: Must be False.
+        :param backend: Must be None.
+        :param persistent: Always True, accepted so
+        Tree(fn, persistent=True) can construct this class.
+        :param sizes: As for Tree.
+        :param ids: As for Tree.
+        """
+        if lazy:
+            raise ValueError("persistent trees cannot be lazy")
+        if backend is not None:
+            raise ValueError("persistent trees have no other backends")
+
+        super().__init__(fn, child_index=child_index, inverse=inverse,
+                         sizes=sizes, ids=ids)
+
+        # nodes keep their current Record
+        self._node_class = node.node_class(sizes, False, ids, ("_record",))
+
+        # nodes whose records are stale, kept while refolds are deferred
+        self._stale = []
+
+    def snapshot(self):
+        """
+        :return: The Record of the root as it is now, None for an empty
+        tree. O(1), later mutations never change it.
+        """
+        return None if self.root is None else self.root._record
+
+    def new_node(self, key, id=None):
+        n = super().new_node(key, id)
+        n._record = Record(n.key, n.subtree_value, ())
+        return n
+
+    def put(self, parent, child):
+        old_parent = child.parent
+        super().put(parent, child)
+        self._recorded(parent, old_parent)
+
+    def swap(self, node_a, node_b):
+        a_parent = node_a.parent
+        b_parent = node_b.parent
+        super().swap(node_a, node_b)
+        if node_a is not node_b:
+            self._recorded(a_parent, b_parent)
+
+    def _flatten_to(self, node, result):
+        super()._flatten_to(node, result)
+        self._recorded(node)
+        return node
+
+    def _refolded(self):
+        stale = self._stale
+        self._stale = []
+        self._record(stale)
+
+    def _bulk_fold(self, order):
+        super()._bulk_fold(order)
+        self._record_all(order)
+
+    def _bulk_trust(self, order):
+        super()._bulk_trust(order)
+        self._record_all(order)
+
+    def _recorded(self, *nodes):
+        # the records of nodes and their ancestors are stale; inside
+        # batch() or an asynctree.AsyncTree operation they are rebuilt by
+        # _refolded once the values are refolded
+        if self._dirty is not None:
+            self._stale.extend(nodes)
+        else:
+            self._record(nodes)
+
+    def _record(self, nodes):
+        # new records for nodes and all their ancestors, each built once
+        # and after those of its children, as in Tree._flush
+        pending = {}
+        for n in nodes:
+            while n is not None and n not in pending:
+                pending[n] = 0
+                n = n.parent
+        for n in pending:
+            if n.parent is not None:
+                pending[n.parent] += 1
+
+        ready = [n for n, count in pending.items() if count == 0]
+        for n in ready:
+            n._record = Record(n.key, n.subtree_value,
+                               tuple(c._record for c in n.children))
+            parent = n.parent
+            if parent is not None:
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    ready.append(parent)
+
+    def _record_all(self, order):
+        # records for a freshly built tree, order lists parents first
+        for n in reversed(order):
+            n._record = Record(n.key, n.subtree_value,
+                               tuple(c._record for c in n.children))
@@ -0,0 +1,113 @@
+"""
+Tree Snapshots
+--------------
+
+A compact binary file format for saving and loading a tree.Tree without
+rebuilding it node by node.
+
+The file is a fixed 24 byte header followed by three columns of n signed
+64 bit little-endian integers:
+
+    header:  magic b"TREESNAP", version (uint32), flags (uint32), n (uint64)
+    keys:    the key of each node
+    parents: the position of each node's parent, -1 for the root
+    values:  the subtree value of each node
+
+Nodes are stored in breadth first order, so every parent comes before its
+children. Loading links the nodes and takes the stored subtree values as
+they are, which makes it O(N) with no calls of fn, unless verification is
+asked for. With mmap=True the columns are read through a memory map of the
+file, so the file is never copied into memory as a whole.
+
+Keys and subtree values must be integers that fit in 64 bits, the same
+restriction as arraytree.ArrayTree.
+"""
+
+import mmap as _mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"TREESNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+
+
+def save(tree, path):
+    """
+    Writes a snapshot of tree.
+    :param tree: The tree.Tree to save, with a root.
+    :param path: The file to write.
+    """
+    if tree.root is None:
+        raise ValueError("cannot save an empty tree")
+
+    order = [tree.root]
+    for n in order:
+        order.extend(n.children)
+    position = {n: i for i, n in enumerate(order)}
+
+    keys = array("q", [n.key for n in order])
+    parents = array("q", [-1 if n.parent is None else position[n.parent]
+                          for n in order])
+    values = array("q", [n.subtree_value for n in order])
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(order)))
+        for column in (keys, parents, values):
+            if sys.byteorder != "little":
+                column.byteswap()
+            column.tofile(f)
+
+
+def load(cls, path, fn, mmap=True, verify=False, **kwargs):
+    """
+    Loads a snapshot written by save().
+    :param cls: The tree class to build, tree.Tree or a subclass.
+    :param path: The snapshot file.
+    :param fn: The aggregating function of the tree.
+    :param mmap: If True, read the columns through a memory map.
+    :param verify: If True, refold every node and raise ValueError on a
+    stored subtree value that does not match.
+    :param kwargs: Passed on to the constructor.
+    :return: The new tree.
+    """
+    with open(path, "rb") as f:
+        if mmap:
+            with _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as data:
+                return _build(cls, memoryview(data), fn, verify, kwargs)
+        return _build(cls, memoryview(f.read()), fn, verify, kwargs)
+
+
+def _build(cls, data, fn, verify, kwargs):
+    with data:
+        if len(data) < HEADER.size:
+            raise ValueError("not a tree snapshot")
+        magic, version, flags, n = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a tree snapshot")
+        if version != VERSION:
+            raise ValueError("unsupported snapshot version {}".format(version))
+        if len(data) != HEADER.size + 3 * 8 * n:
+            raise ValueError("truncated tree snapshot")
+
+        with data[HEADER.size:].cast("q") as columns:
+            if sys.byteorder != "little":
+                columns = array("q", columns)
+                columns.byteswap()
+            keys = columns[:n].tolist()
+            parents = columns[n:2 * n].tolist()
+            values = columns[2 * n:].tolist()
+
+    tree = cls(fn, **kwargs)
+    nodes, order = tree._link_parents(keys, parents)
+    for node, value in zip(nodes, values):
+        node.subtree_value = value
+    tree._bulk_trust(order)
+
+    if verify:
+        for node in reversed(order):
+            if tree._fold(node) != node.subtree_value:
+                raise ValueError("stored subtree value of {!r} does not match"
+                                 .format(node.key))
+    return tree
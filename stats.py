@@ -0,0 +1,170 @@
+"""
+Tree Instrumentation
+--------------------
+
+Opt-in counters and timing for a tree.Tree, switched on with
+tree.enable_stats() and off with tree.disable_stats().
+
+While disabled nothing is checked on the hot path at all: enabling shadows
+the tree's fn and its put, flatten, swap and update_subtree methods with
+counting wrappers on that one instance, and disabling removes them again.
+
+Child indexes (see childindex.py) hold on to the fn they were built with,
+so calls made by indexes created before enable_stats() are not counted.
+The wrapped fn is neither picklable nor the function the tree was built
+with, so code that compares or pickles fn reads tree._raw_fn while it is
+set, and folds done by parallel_refold's workers are not counted.
+
+Counters are updated under a lock, so thread-safe trees (see locking.py) can
+be instrumented too; on those, touched is read from tree.last_touched and
+may come from another thread's operation.
+"""
+
+import threading
+import time
+
+
+class TreeStats:
+    """
+    Counters collected while a tree is instrumented.
+    - fn_calls: calls of the tree's aggregating function.
+    - operations / seconds: per operation name, the number of calls and the
+      total wall time.
+    - ancestors / max_ancestors: nodes refolded (or marked dirty) by the
+      instrumented operations, in total and at most in a single one.
+    - flatten_nodes: nodes visited by flatten.
+    - detaches: children detached from a parent. Detaching moves at most
+      one sibling, so there is no scan length to report.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: Called as callback(name, seconds, touched) after
+        each top level operation, or None.
+        """
+        self.callback = callback
+        self.reset()
+
+        # nesting depth of instrumented calls per thread, only the outermost
+        # records
+        self._active = threading.local()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Sets every counter back to zero.
+        """
+        self.fn_calls = 0
+        self.operations = {}
+        self.seconds = {}
+        self.ancestors = 0
+        self.max_ancestors = 0
+        self.flatten_nodes = 0
+        self.detaches = 0
+
+    def record(self, name, seconds, touched):
+        """
+        Records one finished operation.
+        :param name: The operation name, e.g. "put".
+        :param seconds: Its wall time.
+        :param touched: The nodes it refolded.
+        """
+        with self._lock:
+            self.operations[name] = self.operations.get(name, 0) + 1
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.ancestors += touched
+            if touched > self.max_ancestors:
+                self.max_ancestors = touched
+
+        if self.callback is not None:
+            self.callback(name, seconds, touched)
+
+    def as_dict(self):
+        """
+        :return: The counters as a plain dict.
+        """
+        return {
+            "fn_calls": self.fn_calls,
+            "operations": dict(self.operations),
+            "seconds": dict(self.seconds),
+            "ancestors": self.ancestors,
+            "max_ancestors": self.max_ancestors,
+            "flatten_nodes": self.flatten_nodes,
+            "detaches": self.detaches,
+        }
+
+
+def instrument(tree, stats):
+    """
+    Shadows the hot methods of tree with wrappers feeding stats.
+    :param tree: The tree.Tree to instrument.
+    :param stats: The TreeStats to fill.
+    """
+    raw_fn = tree.fn
+
+    lock = stats._lock
+
+    def fn(a, b):
+        with lock:
+            stats.fn_calls += 1
+        return raw_fn(a, b)
+
+    tree._raw_fn = raw_fn
+    tree.fn = fn
+
+    for name in ("put", "flatten", "swap"):
+        setattr(tree, name, _timed(tree, stats, name, getattr(tree, name), False))
+    tree.update_subtree = _timed(tree, stats, "update_subtree",
+                                 tree.update_subtree, True)
+
+    subtree_keys = tree._subtree_keys
+    detach = tree._detach
+
+    def counted_subtree_keys(node):
+        keys = subtree_keys(node)
+        with lock:
+            stats.flatten_nodes += len(keys)
+        return keys
+
+    def counted_detach(parent, child):
+        with lock:
+            stats.detaches += 1
+        return detach(parent, child)
+
+    tree._subtree_keys = counted_subtree_keys
+    tree._detach = counted_detach
+
+
+def uninstrument(tree):
+    """
+    Removes the wrappers installed by instrument().
+    :param tree: The instrumented tree.Tree.
+    """
+    tree.fn = tree._raw_fn
+    del tree._raw_fn
+    for name in ("put", "flatten", "swap", "update_subtree", "_subtree_keys",
+                 "_detach"):
+        delattr(tree, name)
+
+
+def _timed(tree, stats, name, method, returns_touched):
+    clock = time.perf_counter
+    active = stats._active
+
+    def wrapper(*args):
+        if getattr(active, "depth", 0):
+            return method(*args)
+
+        active.depth = 1
+        start = clock()
+        try:
+            result = method(*args)
+        finally:
+            active.depth = 0
+        elapsed = clock() - start
+
+        touched = result if returns_touched else tree.last_touched
+        stats.record(name, elapsed, touched)
+        return result
+
+    return wrapper
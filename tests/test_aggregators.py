@@ -0,0 +1,115 @@
+import unittest
+import math
+import operator
+import random
+import aggregators
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class AggregatorsTestCase(unittest.TestCase):
+
+    def test_builtin_monoids(self):
+        for fn in (operator.add, operator.mul, operator.xor, max, min,
+                   math.gcd, operator.and_, operator.or_):
+            aggregator = aggregators.lookup(fn)
+            assert aggregator is not None, "registered"
+            assert_equal(fn(12, aggregator.identity), 12, "identity")
+            assert_equal(aggregator.reduce([12, 18, 30]),
+                         fn(fn(12, 18), 30), "reduce")
+
+        assert aggregators.lookup(lambda x, y: x) is None, "unknown lambda"
+
+    def test_registered_matches_unregistered(self):
+        """
+        Every registered fast path gives the same values as plain folding
+        through an equivalent unregistered lambda.
+        """
+        rng = random.Random(2)
+        keys = [rng.randint(1, 1 << 12) for _ in range(400)]
+        parents = [-1] + [rng.randrange(min(i, 20)) for i in range(1, 400)]
+
+        for fn in (operator.add, operator.xor, max, min, math.gcd,
+                   operator.and_, operator.or_):
+            fast = tree.Tree.from_parent_array(keys[:1], [-1], fn)
+            slow = tree.Tree.from_parent_array(keys[:1], [-1],
+                                               lambda x, y, fn=fn: fn(x, y))
+            fast_nodes = [fast.root]
+            slow_nodes = [slow.root]
+            for key, p in zip(keys[1:], parents[1:]):
+                a = fast.new_node(key)
+                b = slow.new_node(key)
+                fast.put(fast_nodes[p], a)
+                slow.put(slow_nodes[p], b)
+                fast_nodes.append(a)
+                slow_nodes.append(b)
+
+            fast.swap(fast_nodes[300], fast_nodes[399])
+            slow.swap(slow_nodes[300], slow_nodes[399])
+            for a, b in zip(fast_nodes, slow_nodes):
+                assert_equal(a.subtree_value, b.subtree_value, "subtree value")
+
+    def test_register_lambda(self):
+        max_agg = lambda x, y: x if x > y else y
+        aggregators.register(max_agg, identity=-math.inf, idempotent=True,
+                             reduce=max)
+        try:
+            t = tree.Tree(max_agg)
+            assert t.aggregator is not None, "picked up from the registry"
+
+            t.create_root(0)
+            hub = t.new_node(0)
+            t.put(t.root, hub)
+            for i in range(100):
+                t.put(hub, t.new_node(i))
+            assert_equal(t.root.subtree_value, 99, "root subtree value")
+
+            t.put(hub, t.new_node(50))
+            assert_equal(t.last_touched, 1, "absorbed at the hub")
+        finally:
+            del aggregators._registry[max_agg]
+
+    def test_auto_inverse(self):
+        t = tree.Tree(operator.xor)
+        assert_equal(t.child_index, None, "no index unless asked")
+        t = tree.Tree(operator.xor, child_index="auto")
+        assert_equal(t.child_index, "inverse", "xor gets an inverse index")
+        t = tree.Tree(operator.add, child_index="auto")
+        assert_equal(t.child_index, None, "subtraction is not exact")
+        t = tree.Tree(operator.add, child_index="auto", inverse=operator.sub)
+        assert_equal(t.child_index, "inverse", "given inverses are trusted")
+        t = tree.Tree(operator.mul, child_index="auto")
+        assert_equal(t.child_index, None, "mul has no inverse")
+
+    def test_float_sums(self):
+        # cases where an inverse index built on subtraction goes wrong
+        t = tree.Tree(operator.add)
+        t.create_root(0.0)
+        a, b, c = t.new_node(math.inf), t.new_node(1.0), t.new_node(2.0)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        t.put(b, c)
+        t.swap(a, c)
+        assert_equal(t.root.subtree_value, math.inf, "inf swapped down")
+
+        t = tree.Tree(operator.add)
+        t.create_root(0.0)
+        inner, other = t.new_node(0.0), t.new_node(0.0)
+        big = t.new_node(1e16)
+        t.put(t.root, inner)
+        t.put(t.root, other)
+        t.put(inner, t.new_node(1.0))
+        t.put(inner, big)
+        t.put(other, big)
+        assert_equal(inner.subtree_value, 1.0, "1e16 moved away")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import operator
+import arraytree
+import tests.test_simple_functions as simple
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class ArrayTreeSimpleFunctionsTestCase(simple.SimpleFunctionsTestCase):
+    """
+    Runs the simple function tests against the array backed tree.
+    """
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+        self.tree = arraytree.ArrayTree(self.max_agg)
+        self.tree.create_root(5)
+
+        self.tree2 = arraytree.ArrayTree(self.max_agg)
+        self.tree2.create_root(1)
+
+        self.xor_tree = arraytree.ArrayTree(operator.xor)
+        self.xor_tree.create_root(1)
+
+
+class ArrayTreeTestCase(unittest.TestCase):
+
+    def test_flatten_visits_every_branch(self):
+        """
+              r(1)
+            /     \\
+          A(2)    B(3)
+          |
+          C(4)
+
+        #flatten(r, add) == 10
+        """
+        t = arraytree.ArrayTree(operator.add)
+        t.create_root(1)
+        a = t.new_node(2)
+        b = t.new_node(3)
+        c = t.new_node(4)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        t.put(a, c)
+
+        t.flatten(t.root, operator.add)
+        assert_equal(t.root.key, 10, "root key")
+        assert t.root.is_external(), "root should be a leaf"
+        assert a.parent is None, "children are cut off"
+
+    def test_move(self):
+        """
+              r(1)                r(1)
+             /    \\              /    \\
+          A(10)  B(100)  ->   A(10)  B(100)
+            |                          |
+          C(1000)                    C(1000)
+        """
+        t = arraytree.ArrayTree(operator.add)
+        t.create_root(1)
+        a = t.new_node(10)
+        b = t.new_node(100)
+        c = t.new_node(1000)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        t.put(a, c)
+
+        t.put(b, c)
+        assert_equal(a.subtree_value, 10, "a lost c")
+        assert_equal(b.subtree_value, 1100, "b got c")
+        assert_equal(t.root.subtree_value, 1111, "root unchanged")
+        assert_equal(c.parent, b, "c under b")
+
+        # and back again, under the same parent as before
+        t.put(a, c)
+        t.put(a, c)
+        assert_equal(a.subtree_value, 1010, "a got c back")
+        assert_equal(b.subtree_value, 100, "b lost c")
+        assert_equal(len(a.children), 1, "c only once")
+
+    def test_columns_are_compact(self):
+        t = arraytree.ArrayTree(operator.add)
+        t.create_root(0)
+        for i in range(1000):
+            t.put(t.root, t.new_node(i))
+
+        assert_equal(len(t), 1001, "rows")
+        assert_equal(t.root.subtree_value, sum(range(1000)), "root value")
+        assert_equal(t.keys.itemsize * 5, 40, "bytes per node")
+
+
+if __name__ == '__main__':
+    unittest.main()
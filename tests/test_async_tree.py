@@ -0,0 +1,134 @@
+import unittest
+import asyncio
+import operator
+import random
+import asynctree
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class AsyncTreeTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def chain(self, fn, n):
+        t = tree.Tree.from_parent_array(list(range(n)), list(range(-1, n - 1)),
+                                        fn)
+        leaf = t.root
+        while leaf.children:
+            leaf = leaf.children[0]
+        return t, leaf
+
+    async def test_yields_during_refold(self):
+        t, leaf = self.chain(operator.add, 5000)
+        at = asynctree.AsyncTree(t, chunk_size=100)
+        ticks = 0
+        done = False
+
+        async def ticker():
+            nonlocal ticks
+            while not done:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.ensure_future(ticker())
+        await at.put(leaf, at.new_node(10))
+        done = True
+        await task
+
+        assert ticks >= 40, "loop ran while refolding"
+        assert_equal(t.last_touched, 5000, "whole chain refolded")
+        assert_equal(await at.read(t.root), 5000 * 4999 // 2 + 10, "root")
+
+    async def test_concurrent_writers(self):
+        t = tree.Tree(operator.add)
+        t.create_root(0)
+        at = asynctree.AsyncTree(t, chunk_size=3)
+        hubs = [at.new_node(0) for _ in range(4)]
+        for h in hubs:
+            await at.put(at.root, h)
+
+        async def writer(i):
+            rng = random.Random(i)
+            mine = [hubs[i % 4]]
+            for k in range(50):
+                child = at.new_node(1)
+                await at.put(rng.choice(mine), child)
+                mine.append(child)
+
+        await asyncio.gather(*(writer(i) for i in range(8)))
+        assert_equal(await at.read(at.root), 400, "every put counted")
+
+        order = [t.root]
+        for n in order:
+            order.extend(n.children)
+        for n in reversed(order):
+            expected = n.key + sum(c.subtree_value for c in n.children)
+            assert_equal(n.subtree_value, expected, "subtree value")
+
+    async def test_read_after_write(self):
+        t, leaf = self.chain(max, 3000)
+        at = asynctree.AsyncTree(t, chunk_size=10)
+        put = asyncio.ensure_future(at.put(leaf, at.new_node(10 ** 6)))
+        await asyncio.sleep(0)
+        assert_equal(await at.read(t.root), 10 ** 6, "read waits for put")
+        await put
+
+    async def test_persistent_snapshots(self):
+        t = tree.Tree(operator.add, persistent=True)
+        t.create_root(1)
+        at = asynctree.AsyncTree(t, chunk_size=2)
+        child = at.new_node(2)
+        await at.put(at.root, child)
+        for i in range(20):
+            await at.put(child, at.new_node(i))
+        assert_equal(t.snapshot().subtree_value, 3 + sum(range(20)), "snapshot")
+        assert_equal(t._stale, [], "nothing left to record")
+
+        await at.flatten(child, operator.add)
+        await at.swap(child, child)
+        assert_equal(t.snapshot().subtree_value, 3 + sum(range(20)), "after flatten")
+        assert_equal(t.snapshot().children[0].children, (), "flattened")
+
+    async def test_swap_and_flatten(self):
+        rng = random.Random(13)
+        n = 2000
+        keys = [rng.randint(0, 1000) for _ in range(n)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        expected = tree.Tree.from_parent_array(keys, parents, operator.xor)
+        t = tree.Tree.from_parent_array(keys, parents, operator.xor)
+        at = asynctree.AsyncTree(t, chunk_size=16, offload_size=100)
+
+        def nodes(x):
+            order = [x.root]
+            for node in order:
+                order.extend(node.children)
+            return order
+
+        a_nodes, e_nodes = nodes(t), nodes(expected)
+        leaves = [i for i, x in enumerate(a_nodes) if x.is_external()]
+        for _ in range(20):
+            i, j = rng.sample(leaves, 2)
+            await at.swap(a_nodes[i], a_nodes[j])
+            expected.swap(e_nodes[i], e_nodes[j])
+
+        big = max(range(1, n), key=lambda i: len(a_nodes[i].children))
+        await at.flatten(a_nodes[big], operator.xor)
+        expected.flatten(e_nodes[big], operator.xor)
+        await at.flatten(a_nodes[big], operator.xor)
+
+        for a, e in zip(nodes(t), nodes(expected)):
+            assert_equal(a.subtree_value, e.subtree_value, "subtree value")
+
+        # the root holds everything, so its keys go through the executor
+        await at.flatten(t.root, operator.xor)
+        assert_equal(t.root.key, expected.root.subtree_value, "offloaded")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def run_workload(self, t, batched):
+        """
+        The same random puts, swaps and flattens, inside a batch or not.
+        """
+        rng = random.Random(9)
+        t.create_root(0)
+        nodes = [t.root]
+        leaves = []
+
+        def mutate():
+            for i in range(300):
+                n = t.new_node(rng.randint(0, 50))
+                t.put(rng.choice(nodes), n)
+                nodes.append(n)
+                leaves.append(n)
+            for i in range(50):
+                a, b = rng.sample(leaves, 2)
+                if a.is_external() and b.is_external():
+                    t.swap(a, b)
+            t.flatten(nodes[150], operator.add)
+
+        if batched:
+            with t.batch():
+                mutate()
+        else:
+            mutate()
+        return nodes
+
+    def test_same_result_as_eager(self):
+        for fn, kwargs in ((operator.add, {}),
+                           (max, {"child_index": "segment"}),
+                           (operator.xor, {"child_index": "inverse",
+                                           "inverse": operator.xor})):
+            eager = self.run_workload(tree.Tree(fn, **kwargs), False)
+            batched = self.run_workload(tree.Tree(fn, **kwargs), True)
+            for a, b in zip(eager, batched):
+                assert_equal(b.subtree_value, a.subtree_value, "subtree value")
+
+    def test_shared_ancestors_refolded_once(self):
+        t = tree.Tree(operator.add)
+        t.create_root(0)
+        hub = t.new_node(0)
+        t.put(t.root, hub)
+
+        with t.batch():
+            for i in range(1000):
+                t.put(hub, t.new_node(1))
+            assert_equal(t.root.subtree_value, 0, "deferred until exit")
+
+        assert_equal(t.root.subtree_value, 1000, "root subtree value")
+        assert_equal(t.last_touched, 2, "hub and root refolded once each")
+
+    def test_nested_batch_flushes_once(self):
+        t = tree.Tree(operator.add)
+        t.create_root(0)
+        with t.batch():
+            with t.batch():
+                t.put(t.root, t.new_node(5))
+            assert_equal(t.root.subtree_value, 0, "inner exit does not flush")
+        assert_equal(t.root.subtree_value, 5, "root subtree value")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import operator
+import random
+import arraytree
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class BulkLoadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+
+        rng = random.Random(3)
+        self.keys = [rng.randint(0, 10000) for _ in range(500)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, 500)]
+
+    def build_with_put(self, fn):
+        t = tree.Tree(fn)
+        nodes = [t.new_node(key) for key in self.keys]
+        t.root = nodes[0]
+        for i in range(1, len(nodes)):
+            t.put(nodes[self.parents[i]], nodes[i])
+        return t, nodes
+
+    def test_matches_put(self):
+        for fn in (self.max_agg, operator.xor, operator.add):
+            expected, _ = self.build_with_put(fn)
+            got = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+            assert_equal(got.root.subtree_value, expected.root.subtree_value,
+                         "root subtree value")
+
+            array_tree = arraytree.ArrayTree.from_parent_array(
+                self.keys, self.parents, fn)
+            assert_equal(array_tree.root.subtree_value,
+                         expected.root.subtree_value, "array root value")
+
+    def test_children_keep_order(self):
+        """
+            r(5)
+           /  |  \\
+        A(1) B(2) C(3)
+        """
+        t = tree.Tree.from_parent_array([5, 1, 2, 3], [None, 0, 0, 0],
+                                        self.max_agg)
+        assert_equal([c.key for c in t.root.children], [1, 2, 3], "children")
+        assert_equal([c.slot for c in t.root.children], [0, 1, 2], "slots")
+
+        array_tree = arraytree.ArrayTree.from_parent_array(
+            [5, 1, 2, 3], [None, 0, 0, 0], self.max_agg)
+        assert_equal([c.key for c in array_tree.root.children], [1, 2, 3],
+                     "array children")
+
+    def test_long_chain(self):
+        n = 100000
+        t = tree.Tree.from_parent_array([1] * n, list(range(-1, n - 1)),
+                                        operator.add)
+        assert_equal(t.root.subtree_value, n, "root subtree value")
+
+    def test_child_index_is_built(self):
+        t = tree.Tree.from_parent_array(self.keys, self.parents, operator.add,
+                                        child_index="inverse",
+                                        inverse=operator.sub)
+        expected, _ = self.build_with_put(operator.add)
+        t.put(t.root, t.new_node(7))
+        assert_equal(t.root.subtree_value, expected.root.subtree_value + 7,
+                     "root after put")
+
+    def test_rejects_forest(self):
+        with self.assertRaises(ValueError):
+            tree.Tree.from_parent_array([1, 2], [-1, -1], operator.add)
+        with self.assertRaises(ValueError):
+            tree.Tree.from_parent_array([1, 2, 3], [-1, 2, 1], operator.add)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class ChildIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+
+    def build_pair(self, fn, **kwargs):
+        """
+        Builds the same random wide tree twice, once plain and once with
+        the requested child index, and returns both with their nodes.
+        """
+        rng = random.Random(7)
+        plain = tree.Tree(fn)
+        indexed = tree.Tree(fn, **kwargs)
+        plain.create_root(1)
+        indexed.create_root(1)
+
+        plain_nodes = [plain.root]
+        indexed_nodes = [indexed.root]
+        for i in range(300):
+            key = rng.randint(0, 1000)
+            # mostly hang off a few hubs to get high fan-out
+            parent = rng.randrange(min(len(plain_nodes), 5))
+            a = plain.new_node(key)
+            b = indexed.new_node(key)
+            plain.put(plain_nodes[parent], a)
+            indexed.put(indexed_nodes[parent], b)
+            plain_nodes.append(a)
+            indexed_nodes.append(b)
+
+        return plain, plain_nodes, indexed, indexed_nodes
+
+    def check_same(self, plain_nodes, indexed_nodes):
+        for a, b in zip(plain_nodes, indexed_nodes):
+            assert_equal(b.subtree_value, a.subtree_value, "subtree value")
+
+    def run_operations(self, fn, **kwargs):
+        plain, p, indexed, q = self.build_pair(fn, **kwargs)
+        self.check_same(p, q)
+
+        plain.swap(p[40], p[200])
+        indexed.swap(q[40], q[200])
+        self.check_same(p, q)
+
+        plain.flatten(p[3], operator.add)
+        indexed.flatten(q[3], operator.add)
+        assert_equal(q[0].subtree_value, p[0].subtree_value, "root after flatten")
+
+    def test_segment_index_max(self):
+        self.run_operations(self.max_agg, child_index="segment")
+
+    def test_segment_index_add(self):
+        self.run_operations(operator.add, child_index="segment")
+
+    def test_inverse_index_xor(self):
+        self.run_operations(operator.xor, child_index="inverse",
+                            inverse=operator.xor)
+
+    def test_inverse_index_add(self):
+        self.run_operations(operator.add, child_index="inverse",
+                            inverse=operator.sub)
+
+    def test_inverse_needs_function(self):
+        with self.assertRaises(ValueError):
+            tree.Tree(lambda x, y: x + y, child_index="inverse")
+
+    def test_registered_inverse_is_used(self):
+        t = tree.Tree(operator.add, child_index="inverse")
+        assert_equal(t.inverse, operator.sub, "inverse from the registry")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import operator
+import random
+import ett
+import tree
+import tests.test_simple_functions as simple
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class EulerSimpleFunctionsTestCase(simple.SimpleFunctionsTestCase):
+    """
+    Runs the simple function tests against the Euler tour tree backend.
+    """
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+        self.tree = tree.Tree(self.max_agg, backend="euler")
+        self.tree.create_root(5)
+
+        self.tree2 = tree.Tree(self.max_agg, backend="euler")
+        self.tree2.create_root(1)
+
+        self.xor_tree = tree.Tree(operator.xor, backend="euler")
+        self.xor_tree.create_root(1)
+
+
+class EulerTourTestCase(unittest.TestCase):
+
+    def test_constructor_flag(self):
+        t = tree.Tree(operator.add, backend="euler")
+        assert isinstance(t, ett.EulerTourTree), "backend flag picks the class"
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, backend="splay")
+
+    def test_matches_default_backend(self):
+        rng = random.Random(21)
+        keys = [rng.randint(0, 1000) for _ in range(300)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, 300)]
+
+        for fn in (max, operator.add, operator.xor):
+            plain = tree.Tree.from_parent_array(keys, parents, fn)
+            euler = tree.Tree.from_parent_array(keys, parents, fn,
+                                                backend="euler")
+
+            def nodes(t):
+                out = [t.root]
+                for n in out:
+                    out.extend(n.children)
+                return out
+
+            p = nodes(plain)
+            q = nodes(euler)
+            leaves = [i for i, n in enumerate(p) if n.is_external()]
+            for _ in range(40):
+                i, j = rng.sample(leaves, 2)
+                plain.swap(p[i], p[j])
+                euler.swap(q[i], q[j])
+            for i in range(30):
+                k = rng.randrange(len(p))
+                a = plain.new_node(i)
+                b = euler.new_node(i)
+                plain.put(p[k], a)
+                euler.put(q[k], b)
+                p.append(a)
+                q.append(b)
+            plain.flatten(p[5], operator.add)
+            euler.flatten(q[5], operator.add)
+
+            for a, b in zip(p, q):
+                assert_equal(b.subtree_value, a.subtree_value, "subtree value")
+
+    def test_long_chain(self):
+        n = 20000
+        t = tree.Tree(operator.add, backend="euler")
+        t.create_root(1)
+        cursor = t.root
+        for i in range(n - 1):
+            child = t.new_node(1)
+            t.put(cursor, child)
+            cursor = child
+
+        assert_equal(t.root.subtree_value, n, "root subtree value")
+        assert_equal(cursor.parent.subtree_value, 2, "near the bottom")
+
+
+if __name__ == '__main__':
+    unittest.main()
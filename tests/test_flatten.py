@@ -0,0 +1,71 @@
+import unittest
+import operator
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class FlattenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+
+    def build(self, fn):
+        """
+                r(1)
+              /     \\
+           A(2)      B(3)
+          /   \\       |
+        C(4)  D(5)   E(6)
+         |
+        F(7)
+        """
+        t = tree.Tree(fn)
+        t.create_root(1)
+        nodes = {"r": t.root}
+        for name, key, parent in (("A", 2, "r"), ("B", 3, "r"), ("C", 4, "A"),
+                                  ("D", 5, "A"), ("E", 6, "B"), ("F", 7, "C")):
+            nodes[name] = t.new_node(key)
+            t.put(nodes[parent], nodes[name])
+        return t, nodes
+
+    def test_flatten_visits_every_branch(self):
+        cases = (
+            (operator.add, 28),
+            (operator.mul, 5040),
+            (operator.xor, 1 ^ 2 ^ 3 ^ 4 ^ 5 ^ 6 ^ 7),
+            (max, 7),
+            (min, 1),
+            (self.max_agg, 7),
+        )
+        for fn, expected in cases:
+            t, nodes = self.build(self.max_agg)
+            t.flatten(t.root, fn)
+            assert_equal(t.root.key, expected, "root key")
+            assert_equal(t.root.subtree_value, expected, "root subtree value")
+
+    def test_flatten_inner_node(self):
+        t, nodes = self.build(operator.add)
+        t.flatten(nodes["A"], operator.add)
+
+        assert_equal(nodes["A"].key, 18, "node a key")
+        assert_equal(t.root.subtree_value, 28, "root subtree value")
+        assert nodes["C"].parent is None, "old children are cut off"
+        assert_equal(len(t.root.children), 2, "root children")
+
+    def test_flatten_deep_chain(self):
+        n = 100000
+        t = tree.Tree.from_parent_array([1] * n, list(range(-1, n - 1)),
+                                        operator.add)
+        t.flatten(t.root, operator.add)
+        assert_equal(t.root.key, n, "root key")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import gc
+import json
+import operator
+import os
+import random
+import tempfile
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class IngestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(9)
+        n = 400
+        self.keys = [rng.randint(0, 10000) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        self.records = [(None if p < 0 else "n{}".format(p), "n{}".format(i),
+                         key)
+                        for i, (p, key) in enumerate(zip(self.parents,
+                                                         self.keys))]
+        rng.shuffle(self.records)
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def temp_file(self, suffix, lines):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        self.paths.append(path)
+        return path
+
+    def check(self, t, fn):
+        expected = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+        assert_equal(t.root.subtree_value, expected.root.subtree_value, "root")
+        assert_equal(t.root.key, self.keys[0], "root key")
+
+        count = 0
+        stack = [t.root]
+        while stack:
+            n = stack.pop()
+            count += 1
+            for slot, c in enumerate(n.children):
+                assert c.parent is n, "parent link"
+                assert_equal(c.slot, slot, "slot")
+                stack.append(c)
+        assert_equal(count, len(self.keys), "node count")
+
+    def test_iterable_out_of_order(self):
+        for fn in (max, operator.add):
+            t = tree.Tree.ingest(self.records, fn, chunk_size=7)
+            self.check(t, fn)
+        assert gc.isenabled(), "gc enabled again"
+
+    def test_gc_left_alone(self):
+        seen = []
+
+        def records():
+            for r in self.records:
+                seen.append(gc.isenabled())
+                yield r
+
+        self.check(tree.Tree.ingest(records(), max), max)
+        assert all(seen), "collector runs unless asked"
+
+    def test_pause_gc_overlapping(self):
+        inner = []
+
+        def records():
+            for i, r in enumerate(self.records):
+                if i == 10:
+                    assert not gc.isenabled(), "paused"
+                    inner.append(tree.Tree.ingest(self.records, max,
+                                                  pause_gc=True))
+                    assert not gc.isenabled(), "still paused for the outer"
+                yield r
+
+        self.check(tree.Tree.ingest(records(), max, pause_gc=True), max)
+        self.check(inner[0], max)
+        assert gc.isenabled(), "gc enabled again"
+
+    def test_files(self):
+        edges = self.temp_file(".txt", [
+            "{} {} {}".format("-" if p is None else p, c, k)
+            for p, c, k in self.records])
+        self.check(tree.Tree.ingest(edges, max), max)
+
+        csv = self.temp_file(".csv", [
+            "{},{},{}".format("-" if p is None else p, c, k)
+            for p, c, k in self.records])
+        self.check(tree.Tree.ingest(csv, max), max)
+
+        lines = []
+        for i, (p, c, k) in enumerate(self.records):
+            if i % 2:
+                lines.append(json.dumps([p, c, k]))
+            else:
+                lines.append(json.dumps({"parent": p, "id": c, "key": k}))
+        jsonl = self.temp_file(".jsonl", lines)
+        self.check(tree.Tree.ingest(jsonl, operator.add), operator.add)
+
+    def test_child_index(self):
+        t = tree.Tree.ingest(self.records, operator.xor, child_index="auto")
+        assert_equal(t.child_index, "inverse", "passed to the constructor")
+        self.check(t, operator.xor)
+        t.put(t.root.children[0], t.new_node(12345))
+        expected = tree.Tree.from_parent_array(self.keys, self.parents,
+                                               operator.xor)
+        assert_equal(t.root.subtree_value,
+                     expected.root.subtree_value ^ 12345, "after put")
+
+    def test_bad_records(self):
+        with self.assertRaises(ValueError):
+            tree.Tree.ingest([(None, 1, 1), ("missing", 2, 2)], max)
+        with self.assertRaises(ValueError):
+            tree.Tree.ingest([(None, 1, 1), (None, 2, 2)], max)
+        with self.assertRaises(ValueError):
+            tree.Tree.ingest([(None, 1, 1), (1, 1, 2)], max)
+        with self.assertRaises(ValueError):
+            tree.Tree.ingest([(2, 1, 1), (1, 2, 2)], max, pause_gc=True)
+        assert gc.isenabled(), "gc enabled again"
+
+
+if __name__ == '__main__':
+    unittest.main()
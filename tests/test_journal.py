@@ -0,0 +1,165 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def state(t):
+    # keys, values and exact child order of every node reachable from root
+    out = []
+    stack = [t.root]
+    while stack:
+        n = stack.pop()
+        assert n.parent is None or n.parent.children[n.slot] is n, "slot"
+        out.append((id(n), n.key, n.subtree_value,
+                    tuple(id(c) for c in n.children)))
+        stack.extend(n.children)
+    return out
+
+
+class JournalTestCase(unittest.TestCase):
+    kwargs = {}
+
+    def setUp(self):
+        rng = random.Random(15)
+        n = 300
+        self.keys = [rng.randint(0, 1000) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        self.rng = rng
+
+    def build(self, fn):
+        return tree.Tree.from_parent_array(self.keys, self.parents, fn,
+                                           **self.kwargs)
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def mutate(self, t, fn, steps):
+        for step in range(steps):
+            nodes = self.nodes(t)
+            choice = self.rng.randrange(4)
+            if choice == 0:
+                t.put(self.rng.choice(nodes),
+                      t.new_node(self.rng.randint(0, 1000)))
+            elif choice == 1:
+                # move a subtree somewhere outside of itself
+                child = self.rng.choice(nodes[1:])
+                inside = set(child.iter_preorder())
+                target = self.rng.choice([x for x in nodes if x not in inside])
+                t.put(target, child)
+            elif choice == 2:
+                leaves = [x for x in nodes if x.is_external() and x.parent]
+                t.swap(*self.rng.sample(leaves, 2))
+            else:
+                inner = [x for x in nodes if x.children]
+                t.flatten(self.rng.choice(inner[len(inner) // 2:]), fn)
+
+    def test_rollback_restores(self):
+        for fn in (operator.add, max, operator.xor):
+            t = self.build(fn)
+            saved = [(t.checkpoint(), state(t))]
+            for _ in range(4):
+                self.mutate(t, fn, 15)
+                saved.append((t.checkpoint(), state(t)))
+
+            for checkpoint, expected in reversed(saved):
+                t.rollback(checkpoint)
+                assert_equal(state(t), expected, "state at checkpoint")
+
+    def test_rollback_cost(self):
+        n = 20000
+        t = tree.Tree.from_parent_array(list(range(n)),
+                                        [-1] + [0] * (n - 1), operator.add,
+                                        **self.kwargs)
+        checkpoint = t.checkpoint()
+        t.flatten(t.root, operator.add)
+        t.rollback(checkpoint)
+        assert_equal(t.last_touched, 1, "only the flattened node refolded")
+        assert_equal(len(t.root.children), n - 1, "children back")
+        assert_equal(t.root.subtree_value, n * (n - 1) // 2, "root value")
+
+    def test_batch_flatten_rollback(self):
+        # b is refolded by the flush while flatten has it cut off
+        for index in (None, "segment", "inverse"):
+            kwargs = dict(self.kwargs, child_index=index)
+            t = tree.Tree(operator.xor, **kwargs)
+            t.create_root(1)
+            a = t.new_node(2)
+            b = t.new_node(4)
+            t.put(t.root, a)
+            t.put(a, b)
+            checkpoint = t.checkpoint()
+            with t.batch():
+                t.put(b, t.new_node(8))
+                t.flatten(a, operator.add)
+            t.rollback(checkpoint)
+            assert_equal(a.subtree_value, 6, "a after rollback")
+            assert_equal(t.root.subtree_value, 7, "root after rollback")
+
+            t.put(b, t.new_node(16))
+            assert_equal(t.root.subtree_value, 23, "index still right")
+
+    def test_limit_and_truncate(self):
+        t = self.build(operator.add)
+        t.enable_journal(limit=5)
+        first = t.checkpoint()
+        self.mutate(t, operator.add, 10)
+        with self.assertRaises(ValueError):
+            t.rollback(first)
+
+        middle = t.checkpoint()
+        before = state(t)
+        self.mutate(t, operator.add, 3)
+        t.rollback(middle)
+        assert_equal(state(t), before, "recent checkpoint still works")
+
+        self.mutate(t, operator.add, 2)
+        t.truncate_journal()
+        with self.assertRaises(ValueError):
+            t.rollback(middle)
+
+        t.disable_journal()
+        with self.assertRaises(ValueError):
+            t.rollback(middle)
+
+
+class LazyJournalTestCase(JournalTestCase):
+    kwargs = {"lazy": True}
+
+    def test_rollback_cost(self):
+        pass
+
+
+class SegmentJournalTestCase(JournalTestCase):
+    kwargs = {"child_index": "segment"}
+
+
+class PersistentJournalTestCase(JournalTestCase):
+    kwargs = {"persistent": True}
+
+    def test_versions_after_rollback(self):
+        t = self.build(operator.add)
+        checkpoint = t.checkpoint()
+        version = t.snapshot()
+        self.mutate(t, operator.add, 20)
+        t.rollback(checkpoint)
+
+        def thaw(r):
+            return (r.key, r.subtree_value, tuple(thaw(c) for c in r.children))
+
+        assert_equal(thaw(t.snapshot()), thaw(version), "same version again")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import operator
+import tree
+import tests.test_simple_functions as simple
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class LazySimpleFunctionsTestCase(simple.SimpleFunctionsTestCase):
+    """
+    Runs the simple function tests against lazy trees.
+    """
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+        self.tree = tree.Tree(self.max_agg, lazy=True)
+        self.tree.create_root(5)
+
+        self.tree2 = tree.Tree(self.max_agg, lazy=True)
+        self.tree2.create_root(1)
+
+        self.xor_tree = tree.Tree(operator.xor, lazy=True)
+        self.xor_tree.create_root(1)
+
+
+class LazySegmentSimpleFunctionsTestCase(simple.SimpleFunctionsTestCase):
+    """
+    Runs the simple function tests against lazy trees with child indexes.
+    """
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+        self.tree = tree.Tree(self.max_agg, child_index="segment", lazy=True)
+        self.tree.create_root(5)
+
+        self.tree2 = tree.Tree(self.max_agg, child_index="segment", lazy=True)
+        self.tree2.create_root(1)
+
+        self.xor_tree = tree.Tree(operator.xor, child_index="inverse",
+                                  inverse=operator.xor, lazy=True)
+        self.xor_tree.create_root(1)
+
+
+class LazyTestCase(unittest.TestCase):
+
+    def test_marking_stops_at_dirty_ancestor(self):
+        t = tree.Tree(operator.add, lazy=True)
+        t.create_root(0)
+        chain = [t.root]
+        for i in range(100):
+            n = t.new_node(1)
+            t.put(chain[-1], n)
+            chain.append(n)
+            assert_equal(t.last_touched, 1, "only the new parent is marked")
+
+        assert_equal(t.root.subtree_value, 100, "root subtree value")
+        assert not chain[50]._dirty, "reading refreshed the whole path"
+
+        t.put(chain[-1], t.new_node(1))
+        assert_equal(t.last_touched, 101, "clean path is marked again")
+
+    def test_deep_refresh_does_not_recurse(self):
+        t = tree.Tree(operator.add, lazy=True)
+        t.create_root(0)
+        cursor = t.root
+        for i in range(5000):
+            n = t.new_node(1)
+            t.put(cursor, n)
+            cursor = n
+
+        assert_equal(t.root.subtree_value, 5000, "root subtree value")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def naive_lca(a, b):
+    ancestors = set()
+    while a is not None:
+        ancestors.add(a)
+        a = a.parent
+    while b not in ancestors:
+        b = b.parent
+    return b
+
+
+class LcaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.rng = rng
+        keys = [rng.randint(0, 100) for _ in range(400)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, 400)]
+        self.tree = tree.Tree.from_parent_array(keys, parents, operator.add)
+
+        self.nodes = []
+        stack = [self.tree.root]
+        while stack:
+            n = stack.pop()
+            self.nodes.append(n)
+            stack.extend(n.children)
+
+    def check_random_pairs(self):
+        for _ in range(300):
+            a, b = self.rng.sample(self.nodes, 2)
+            assert self.tree.lca(a, b) is naive_lca(a, b), "lca"
+
+    def test_matches_naive(self):
+        self.check_random_pairs()
+        root = self.tree.root
+        assert self.tree.lca(root, self.nodes[-1]) is root, "root is an ancestor"
+        assert self.tree.lca(self.nodes[7], self.nodes[7]) is self.nodes[7], \
+            "node is its own lca"
+
+    def test_stays_correct_under_mutation(self):
+        self.check_random_pairs()
+
+        leaves = [n for n in self.nodes if n.is_external()]
+        for _ in range(20):
+            a, b = self.rng.sample(leaves, 2)
+            self.tree.swap(a, b)
+        for _ in range(20):
+            n = self.tree.new_node(1)
+            self.tree.put(self.rng.choice(self.nodes), n)
+            self.nodes.append(n)
+
+        self.check_random_pairs()
+
+    def test_deep_chain(self):
+        n = 50000
+        t = tree.Tree.from_parent_array([1] * n, list(range(-1, n - 1)),
+                                        operator.add)
+        deepest = t.root
+        while deepest.children:
+            deepest = deepest.children[0]
+        middle = deepest
+        for _ in range(n // 2):
+            middle = middle.parent
+
+        assert t.lca(deepest, middle) is middle, "ancestor on a chain"
+        assert_equal(t.depth(deepest), n - 1, "depth")
+
+    def test_different_trees(self):
+        other = tree.Tree(operator.add)
+        other.create_root(1)
+        assert self.tree.lca(self.tree.root, other.root) is None, "no lca"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import operator
+import random
+import aggregators
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+AGGREGATES = {"max": max, "sum": operator.add, "xor": operator.xor}
+
+
+class MultiAggregateTestCase(unittest.TestCase):
+    backend = None
+
+    def build(self, keys, parents):
+        kwargs = {}
+        if self.backend is not None:
+            kwargs["backend"] = self.backend
+        multi = tree.Tree.from_parent_array(keys, parents, AGGREGATES, **kwargs)
+        singles = {name: tree.Tree.from_parent_array(keys, parents, fn)
+                   for name, fn in AGGREGATES.items()}
+        return multi, singles
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def check(self, multi, singles):
+        multi_nodes = self.nodes(multi)
+        for name, single in singles.items():
+            for a, b in zip(multi_nodes, self.nodes(single)):
+                assert_equal(a.agg[name], b.subtree_value, name)
+
+    def test_named_values(self):
+        t = tree.Tree(AGGREGATES)
+        t.create_root(5)
+        t.put(t.root, t.new_node(3))
+        t.put(t.root, t.new_node(9))
+
+        assert_equal(t.root.agg["max"], 9, "max")
+        assert_equal(t.root.agg["sum"], 17, "sum")
+        assert_equal(t.root.agg["xor"], 5 ^ 3 ^ 9, "xor")
+        assert_equal(t.root.agg.sum, 17, "attribute")
+        assert_equal(tuple(t.root.subtree_value), (9, 17, 5 ^ 3 ^ 9), "tuple")
+
+    def test_key_per_aggregate(self):
+        t = tree.Tree({"max": max, "count": operator.add})
+        t.create_root((4, 1))
+        for key in (7, 2, 6):
+            t.put(t.root, t.new_node((key, 1)))
+        assert_equal(t.root.agg["count"], 4, "count")
+        assert_equal(t.root.agg["max"], 7, "max")
+
+        with self.assertRaises(ValueError):
+            t.new_node((1, 2, 3))
+
+    def test_matches_separate_trees(self):
+        rng = random.Random(4)
+        n = 300
+        keys = [rng.randint(0, 1000) for _ in range(n)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        multi, singles = self.build(keys, parents)
+        self.check(multi, singles)
+
+        multi_nodes = self.nodes(multi)
+        single_nodes = {name: self.nodes(s) for name, s in singles.items()}
+
+        # moves, fresh puts, swaps of leaves and flattens
+        for step in range(100):
+            leaves = [i for i, x in enumerate(multi_nodes)
+                      if x.is_external() and x.parent is not None]
+            a, b = rng.sample(leaves, 2)
+            multi.swap(multi_nodes[a], multi_nodes[b])
+            for name, s in singles.items():
+                s.swap(single_nodes[name][a], single_nodes[name][b])
+
+            p = rng.randrange(len(multi_nodes))
+            key = rng.randint(0, 1000)
+            multi.put(multi_nodes[p], multi.new_node(key))
+            for name, s in singles.items():
+                s.put(single_nodes[name][p], s.new_node(key))
+
+            multi_nodes = self.nodes(multi)
+            single_nodes = {name: self.nodes(s) for name, s in singles.items()}
+
+        inner = next(i for i, x in enumerate(multi_nodes)
+                     if x.children and x.parent is not None)
+        multi.flatten(multi_nodes[inner], AGGREGATES)
+        for name, s in singles.items():
+            s.flatten(single_nodes[name][inner], AGGREGATES[name])
+        self.check(multi, singles)
+
+    def test_fused_inverse(self):
+        t = tree.Tree({"sum": operator.add, "xor": operator.xor},
+                      child_index="inverse")
+        assert_equal(t.inverse is not None, True, "both parts invert")
+
+        t.create_root(1)
+        children = [t.new_node(k) for k in (2, 3, 4)]
+        for c in children:
+            t.put(t.root, c)
+        t.put(children[0], children[2])
+        assert_equal(tuple(t.root.agg), (10, 1 ^ 2 ^ 3 ^ 4), "root")
+        assert_equal(tuple(children[0].agg), (6, 2 ^ 4), "moved under")
+
+    def test_fresh_lambdas_not_kept(self):
+        fused = len(aggregators._fused)
+        registry = len(aggregators._registry)
+        for _ in range(100):
+            t = tree.Tree({"max": max, "sum": lambda a, b: a + b})
+            t.create_root(2)
+            t.put(t.root, t.new_node(5))
+            assert_equal(tuple(t.root.agg), (5, 7), "root")
+            t.flatten(t.root, {"max": max, "sum": lambda a, b: a + b})
+            assert_equal(tuple(t.root.agg), (5, 7), "flattened")
+
+        assert_equal(len(aggregators._fused), fused, "fuse cache")
+        assert_equal(len(aggregators._registry), registry, "registry")
+        assert_equal(aggregators.fuse(AGGREGATES), aggregators.fuse(AGGREGATES),
+                     "registered parts are cached")
+
+    def test_single_walk(self):
+        t = tree.Tree(AGGREGATES)
+        t.create_root(0)
+        last = t.root
+        for i in range(1, 50):
+            child = t.new_node(i)
+            t.put(last, child)
+            last = child
+        t.put(last, t.new_node(100))
+        assert_equal(t.last_touched, 50, "one walk for all aggregates")
+
+
+class EulerMultiAggregateTestCase(MultiAggregateTestCase):
+    backend = "euler"
+
+    def test_single_walk(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
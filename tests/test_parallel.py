@@ -0,0 +1,90 @@
+import unittest
+import math
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class ParallelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(12)
+        n = 3000
+        self.keys = [rng.randint(1, 1 << 20) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(max(0, i - 50), i)
+                               for i in range(1, n)]
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def test_refold_matches(self):
+        for fn in (max, operator.xor, math.gcd):
+            expected = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+            t = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+            for n in self.nodes(t):
+                n.subtree_value = 0
+                n.child_index = None
+
+            t.parallel_refold(workers=2)
+            for a, b in zip(self.nodes(t), self.nodes(expected)):
+                assert_equal(a.subtree_value, b.subtree_value, "subtree value")
+
+            # indexes were rebuilt, updates still propagate
+            t.put(t.root.children[0], t.new_node(1 << 21))
+            expected.put(expected.root.children[0], expected.new_node(1 << 21))
+            assert_equal(t.root.subtree_value, expected.root.subtree_value,
+                         "after put")
+
+    def test_chain(self):
+        n = 2000
+        t = tree.Tree.from_parent_array(list(range(n)), list(range(-1, n - 1)),
+                                        operator.add)
+        t.parallel_refold(workers=3)
+        assert_equal(t.root.subtree_value, n * (n - 1) // 2, "chain total")
+
+    def test_lazy_sizes(self):
+        t = tree.Tree(operator.add, lazy=True, sizes=True)
+        t.create_root(1)
+        nodes = [t.root]
+        for i in range(6):
+            n = t.new_node(i)
+            t.put(nodes[i // 2], n)
+            nodes.append(n)
+        t.parallel_refold(workers=2)
+        assert_equal(t.size(), 7, "pending size changes folded in")
+        assert_equal(nodes[1].subtree_size, 3, "inner size")
+        assert_equal(t.root.subtree_value, 16, "total")
+
+    def test_parallel_flatten(self):
+        for fn in (operator.add, max):
+            t = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+            inner = t.root.children[0]
+            expected = sum(self.keys) if fn is operator.add else max(self.keys)
+            expected_inner = inner.subtree_value
+
+            t.parallel_flatten(inner, fn, workers=2)
+            assert inner.is_external(), "children cut"
+            assert_equal(inner.key, expected_inner, "flattened key")
+            assert_equal(t.root.subtree_value, expected, "root unchanged")
+
+    def test_needs_integer_keys(self):
+        t = tree.Tree(operator.add)
+        t.create_root(1.5)
+        t.put(t.root, t.new_node(2.5))
+        with self.assertRaises(ValueError):
+            t.parallel_refold(workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import operator
+import random
+import persistent
+import traversal
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def freeze(n):
+    # the shape, keys and values of a live subtree as nested tuples
+    return (n.key, n.subtree_value, tuple(freeze(c) for c in n.children))
+
+
+def thaw(record):
+    return (record.key, record.subtree_value,
+            tuple(thaw(c) for c in record.children))
+
+
+class PersistentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(14)
+        n = 300
+        self.keys = [rng.randint(0, 1000) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        self.rng = rng
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def test_constructor(self):
+        t = tree.Tree(operator.add, persistent=True)
+        assert isinstance(t, persistent.PersistentTree), "dispatched"
+        assert t.snapshot() is None, "empty tree"
+        t.create_root(3)
+        assert_equal(thaw(t.snapshot()), (3, 3, ()), "single node")
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, persistent=True, lazy=True)
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, persistent=True, backend="euler")
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, persistent=True, threadsafe=True)
+
+    def test_versions_are_frozen(self):
+        for fn in (operator.add, max):
+            t = tree.Tree.from_parent_array(self.keys, self.parents, fn,
+                                            persistent=True)
+            versions = [(t.snapshot(), freeze(t.root))]
+
+            for step in range(60):
+                nodes = self.nodes(t)
+                choice = step % 3
+                if choice == 0:
+                    t.put(self.rng.choice(nodes),
+                          t.new_node(self.rng.randint(0, 1000)))
+                elif choice == 1:
+                    leaves = [x for x in nodes if x.is_external() and x.parent]
+                    t.swap(*self.rng.sample(leaves, 2))
+                else:
+                    inner = [x for x in nodes if x.children]
+                    t.flatten(self.rng.choice(inner[len(inner) // 2:]), fn)
+                versions.append((t.snapshot(), freeze(t.root)))
+
+            for record, expected in versions:
+                assert_equal(thaw(record), expected, "version")
+
+    def test_path_copying_shares(self):
+        t = tree.Tree.from_parent_array(self.keys, self.parents, operator.add,
+                                        persistent=True)
+        before = t.snapshot()
+        leaf = next(x for x in self.nodes(t)
+                    if x.is_external() and x.parent is not t.root)
+        t.put(leaf, t.new_node(5))
+        after = t.snapshot()
+
+        old = set(map(id, traversal.preorder(before)))
+        new = list(traversal.preorder(after))
+        depth = 0
+        n = leaf
+        while n is not None:
+            depth += 1
+            n = n.parent
+        fresh = [r for r in new if id(r) not in old]
+        assert_equal(len(fresh), depth + 1, "path and the new leaf copied")
+        assert_equal(len(new), len(self.keys) + 1, "whole tree reachable")
+
+    def test_batch(self):
+        t = tree.Tree.from_parent_array(self.keys, self.parents, operator.add,
+                                        persistent=True)
+        before = freeze(t.root)
+        version = t.snapshot()
+        with t.batch():
+            for x in self.nodes(t)[:20]:
+                t.put(x, t.new_node(1))
+        assert_equal(thaw(version), before, "old version")
+        assert_equal(thaw(t.snapshot()), freeze(t.root), "new version")
+        assert_equal(t.snapshot().subtree_value, sum(self.keys) + 20, "total")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import operator
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class PropagationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.max_agg = lambda x, y: x if x > y else y
+
+    def make_chain(self, t, keys):
+        """
+        Builds a single path r - n_1 - n_2 - ... below the root.
+        """
+        nodes = [t.root]
+        for key in keys:
+            child = t.new_node(key)
+            t.put(nodes[-1], child)
+            nodes.append(child)
+        return nodes
+
+    def test_deep_chain_does_not_recurse(self):
+        """
+        A chain far deeper than the recursion limit still bubbles up.
+        """
+        t = tree.Tree(operator.add)
+        t.create_root(0)
+        nodes = self.make_chain(t, [1] * 2000)
+
+        assert_equal(t.root.subtree_value, 2000, "root subtree value")
+        assert_equal(t.last_touched, 2000, "every ancestor refolded")
+
+        t.flatten(nodes[1000], operator.add)
+        assert_equal(t.root.subtree_value, 2000, "root after flatten")
+
+    def test_max_stops_at_unchanged_ancestor(self):
+        """
+        r(100) - A(1) - B(1) - ... ; a small key only changes its parent.
+        """
+        t = tree.Tree(self.max_agg)
+        t.create_root(100)
+        nodes = self.make_chain(t, [1] * 10)
+
+        t.put(nodes[-1], t.new_node(5))
+        assert_equal(t.last_touched, 11, "climbs until root is unchanged")
+
+        t.put(nodes[5], t.new_node(3))
+        assert_equal(t.last_touched, 1, "parent already holds 5")
+        assert_equal(t.root.subtree_value, 100, "root subtree value")
+
+    def test_swap_reports_touched(self):
+        t = tree.Tree(self.max_agg)
+        t.create_root(0)
+        a = t.new_node(1)
+        b = t.new_node(2)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        x = t.new_node(7)
+        t.put(a, x)
+
+        t.swap(x, b)
+        assert_equal(a.subtree_value, 2, "node a subtree value")
+        assert_equal(t.root.subtree_value, 7, "root subtree value")
+        assert t.last_touched > 0, "swap should report refolded nodes"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import functools
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def path_to_root(n):
+    path = []
+    while n is not None:
+        path.append(n)
+        n = n.parent
+    return path
+
+
+def brute_path(a, b):
+    up_a = path_to_root(a)
+    up_b = path_to_root(b)
+    on_a = set(up_a)
+    top = next(n for n in up_b if n in on_a)
+    nodes = up_a[:up_a.index(top) + 1] + up_b[:up_b.index(top)]
+    return [n.key for n in nodes]
+
+
+def brute_keys(n):
+    keys = [n.key]
+    for c in n.children:
+        keys.extend(brute_keys(c))
+    return keys
+
+
+class QueriesTestCase(unittest.TestCase):
+    backend = None
+
+    def make_tree(self, fn, n, rng):
+        keys = [rng.randint(0, 1000) for _ in range(n)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        kwargs = {}
+        if self.backend is not None:
+            kwargs["backend"] = self.backend
+        return tree.Tree.from_parent_array(keys, parents, fn, **kwargs)
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def check_queries(self, t, rng, fn):
+        nodes = self.nodes(t)
+        for _ in range(50):
+            a, b = rng.choice(nodes), rng.choice(nodes)
+            assert_equal(t.path_aggregate(a, b),
+                         functools.reduce(fn, brute_path(a, b)), "path")
+
+            up = path_to_root(a)
+            k = rng.randrange(len(up) + 2)
+            expected = up[k] if k < len(up) else None
+            assert t.kth_ancestor(a, k) is expected, "kth ancestor"
+
+    def test_path_and_ancestors(self):
+        rng = random.Random(5)
+        t = self.make_tree(operator.add, 300, rng)
+        self.check_queries(t, rng, operator.add)
+
+    def test_under_mutation(self):
+        rng = random.Random(6)
+        t = self.make_tree(max, 200, rng)
+
+        for step in range(30):
+            nodes = self.nodes(t)
+            leaves = [x for x in nodes if x.is_external() and x.parent]
+            t.swap(*rng.sample(leaves, 2))
+            t.put(rng.choice(nodes), t.new_node(rng.randint(0, 1000)))
+
+            # move a whole subtree under a leaf
+            leaf = rng.choice(leaves)
+            inner = [x for x in nodes if x.children and x.parent
+                     and x not in path_to_root(leaf)]
+            if inner:
+                t.put(leaf, rng.choice(inner))
+            self.check_queries(t, rng, max)
+
+        inner = [x for x in self.nodes(t) if x.children and x.parent]
+        t.flatten(inner[0], operator.add)
+        self.check_queries(t, rng, max)
+
+    def test_root_path(self):
+        t = tree.Tree(operator.add)
+        t.create_root(1)
+        a = t.new_node(2)
+        b = t.new_node(4)
+        t.put(t.root, a)
+        t.put(a, b)
+        assert_equal(t.path_aggregate(t.root, b), 7, "root to node")
+        assert_equal(t.path_aggregate(b, b), 4, "single node")
+        assert t.kth_ancestor(b, 2) is t.root, "grandparent"
+        assert t.kth_ancestor(b, 3) is None, "above the root"
+        with self.assertRaises(ValueError):
+            t.kth_ancestor(b, -1)
+
+    def test_subtree_aggregate(self):
+        rng = random.Random(7)
+        t = self.make_tree(operator.add, 200, rng)
+        for n in self.nodes(t)[:20]:
+            keys = brute_keys(n)
+            assert_equal(t.subtree_aggregate(n, operator.add), sum(keys), "own fn")
+            assert_equal(t.subtree_aggregate(n, max), max(keys), "other fn")
+            assert_equal(t.subtree_aggregate(n, operator.xor),
+                         functools.reduce(operator.xor, keys), "xor")
+        assert_equal(len(self.nodes(t)), 200, "tree unchanged")
+
+    def test_subtree_aggregate_multi(self):
+        t = tree.Tree({"max": max, "sum": operator.add}, backend=self.backend)
+        t.create_root(3)
+        for key in (8, 1):
+            t.put(t.root, t.new_node(key))
+        assert_equal(t.subtree_aggregate(t.root, max), 8, "max part")
+        assert_equal(t.subtree_aggregate(t.root, operator.add), 12, "sum part")
+
+
+class EulerQueriesTestCase(QueriesTestCase):
+    backend = "euler"
+
+
+if __name__ == '__main__':
+    unittest.main()
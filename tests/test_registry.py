@@ -0,0 +1,123 @@
+import unittest
+import gc
+import operator
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class RegistryTestCase(unittest.TestCase):
+    kwargs = {"ids": True}
+
+    def build(self):
+        #      r
+        #     / \
+        #    a   b
+        #   / \
+        #  c   d
+        t = tree.Tree(operator.add, **self.kwargs)
+        t.create_root(0, id="r")
+        for name, parent, key in (("a", "r", 1), ("b", "r", 2),
+                                  ("c", "a", 3), ("d", "a", 4)):
+            t.put(t.get(parent), t.new_node(key, id=name))
+        return t
+
+    def test_get_and_contains(self):
+        t = self.build()
+        for name, key in (("r", 0), ("a", 1), ("b", 2), ("c", 3), ("d", 4)):
+            assert name in t, "registered"
+            assert_equal(t.get(name).key, key, "key of " + name)
+            assert_equal(t.get(name).id, name, "id of " + name)
+        assert "x" not in t, "unknown id"
+        assert_equal(t.get("x"), None, "unknown id")
+        assert_equal(t.get("x", 7), 7, "default")
+
+    def test_ids_off_by_default(self):
+        kwargs = dict(self.kwargs, ids=False)
+        t = tree.Tree(operator.add, **kwargs)
+        with self.assertRaises(ValueError):
+            t.create_root(0, id="r")
+        t.create_root(0)
+        assert_equal(t.root.id, None, "no id")
+        assert "r" not in t, "nothing registered"
+
+    def test_duplicate_id(self):
+        t = self.build()
+        with self.assertRaises(ValueError):
+            t.new_node(9, id="a")
+
+    def test_swap_and_move_keep_ids(self):
+        t = self.build()
+        t.swap(t.get("c"), t.get("b"))
+        t.put(t.get("b"), t.get("d"))
+        assert_equal(t.get("b").parent, t.get("a"), "b moved under a")
+        assert_equal(t.get("d").parent, t.get("b"), "d moved under b")
+        assert_equal(t.get("r").subtree_value, 10, "values unchanged")
+
+    def test_flatten_discards_ids(self):
+        t = self.build()
+        c = t.get("c")
+        t.flatten(t.get("a"), operator.add)
+        assert "a" in t, "flattened node stays"
+        assert "c" not in t and "d" not in t, "descendants dropped"
+        assert_equal(t.get("a").key, 8, "flattened key")
+
+        # putting a discarded node back registers it again
+        t.put(t.get("b"), c)
+        assert_equal(t.get("c"), c, "registered again")
+
+    def test_discarded_nodes_are_freed(self):
+        t = self.build()
+        t.put(t.root, t.new_node(5, id="e"))
+        t.flatten(t.root, operator.add)
+        gc.collect()
+        for name in "abcde":
+            assert name not in t, "dropped " + name
+        assert_equal(len(t._ids), 1, "only the root is left")
+
+        # a node that was never put anywhere is freed with its last
+        # reference
+        t.new_node(6, id="f")
+        gc.collect()
+        assert "f" not in t, "freed"
+
+    def test_rollback_restores_ids(self):
+        t = self.build()
+        checkpoint = t.checkpoint()
+        t.flatten(t.get("a"), operator.add)
+        t.rollback(checkpoint)
+        for name in "rabcd":
+            assert name in t, "restored " + name
+        assert_equal(t.get("c").parent, t.get("a"), "linked again")
+
+
+class EulerRegistryTestCase(RegistryTestCase):
+    kwargs = {"backend": "euler", "ids": True}
+
+    def test_rollback_restores_ids(self):
+        pass
+
+
+class PersistentRegistryTestCase(RegistryTestCase):
+    kwargs = {"persistent": True, "ids": True}
+
+
+class IngestRegistryTestCase(unittest.TestCase):
+    def test_ingest_ids(self):
+        records = [("a", "b", 2), (None, "a", 1), ("a", "c", 3)]
+        t = tree.Tree.ingest(records, operator.add, ids=True)
+        assert_equal(t.get("a"), t.root, "root by id")
+        assert_equal(t.get("c").parent, t.root, "child by id")
+
+        t = tree.Tree.ingest(records, operator.add)
+        assert "a" not in t, "ids are only registered on request"
+
+
+if __name__ == '__main__':
+    unittest.main()
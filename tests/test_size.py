@@ -0,0 +1,198 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def nodes_of(t):
+    nodes = [t.root]
+    for n in nodes:
+        nodes.extend(n.children)
+    return nodes
+
+
+def true_size(n):
+    return 1 + sum(true_size(c) for c in n.children)
+
+
+def true_height(n):
+    return max((1 + true_height(c) for c in n.children), default=0)
+
+
+class SizeTestCase(unittest.TestCase):
+    kwargs = {"sizes": True}
+    exact_height = False
+
+    def setUp(self):
+        rng = random.Random(24)
+        n = 200
+        self.keys = [rng.randint(0, 1000) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        self.rng = rng
+
+    def build(self):
+        return tree.Tree.from_parent_array(self.keys, self.parents,
+                                           operator.add, **self.kwargs)
+
+    def check(self, t):
+        nodes = nodes_of(t)
+        assert_equal(t.size(), len(nodes), "tree size")
+        for n in nodes:
+            assert_equal(n.subtree_size, true_size(n), "subtree size")
+
+        height = true_height(t.root)
+        if self.exact_height:
+            assert_equal(t.height(), height, "height")
+        else:
+            assert t.height() >= height, "height is an upper bound"
+
+        depth = {t.root: 0}
+        for n in nodes[1:]:
+            depth[n] = depth[n.parent] + 1
+        for n in self.rng.sample(nodes, 10):
+            assert_equal(t.depth(n), depth[n], "depth")
+
+    def test_bulk_build(self):
+        t = self.build()
+        self.check(t)
+        assert_equal(t.height(), true_height(t.root), "exact after build")
+
+    def test_puts_keep_exact_height(self):
+        t = tree.Tree(operator.add, **self.kwargs)
+        t.create_root(0)
+        nodes = [t.root]
+        for i in range(300):
+            n = t.new_node(i)
+            t.put(self.rng.choice(nodes), n)
+            nodes.append(n)
+        self.check(t)
+        assert_equal(t.height(), true_height(t.root), "exact after puts")
+
+    def test_mutations(self):
+        t = self.build()
+        for step in range(200):
+            nodes = nodes_of(t)
+            choice = self.rng.randrange(4)
+            if choice == 0:
+                t.put(self.rng.choice(nodes), t.new_node(step))
+            elif choice == 1:
+                child = self.rng.choice(nodes[1:])
+                inside = set(child.iter_preorder())
+                t.put(self.rng.choice([x for x in nodes if x not in inside]),
+                      child)
+            elif choice == 2:
+                leaves = [x for x in nodes if x.is_external() and x.parent]
+                t.swap(*self.rng.sample(leaves, 2))
+            elif len(nodes) > 50:
+                inner = [x for x in nodes if x.children and x.parent]
+                t.flatten(self.rng.choice(inner), operator.add)
+            if step % 20 == 0:
+                self.check(t)
+        self.check(t)
+
+    def test_swap_subtrees(self):
+        t = tree.Tree(operator.add, **self.kwargs)
+        t.create_root(0)
+        a = t.new_node(1)
+        b = t.new_node(2)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        below_a = t.new_node(3)
+        t.put(a, below_a)
+        chain = below_a
+        for i in range(5):
+            n = t.new_node(i)
+            t.put(chain, n)
+            chain = n
+        leaf = t.new_node(4)
+        t.put(b, leaf)
+
+        t.swap(below_a, leaf)
+        assert_equal(a.subtree_size, 2, "a lost the chain")
+        assert_equal(b.subtree_size, 7, "b got it")
+        assert_equal(t.size(), 10, "size unchanged")
+        assert t.height() >= 7, "height is an upper bound"
+
+    def test_empty(self):
+        t = tree.Tree(operator.add, **self.kwargs)
+        assert_equal(t.size(), 0, "empty size")
+        assert_equal(t.height(), 0, "empty height")
+        t.create_root(5)
+        assert_equal(t.size(), 1, "lone root size")
+        assert_equal(t.height(), 0, "lone root height")
+
+
+class SizeCostTestCase(unittest.TestCase):
+    def chain(self, n, **kwargs):
+        t = tree.Tree.from_parent_array(list(range(n)),
+                                        [-1] + list(range(n - 1)), max,
+                                        **kwargs)
+        return t, t.root.iter_leaves().__next__()
+
+    def test_off_by_default(self):
+        t, leaf = self.chain(1000)
+        t.put(leaf, t.new_node(0))
+        assert_equal(t.last_touched, 1, "early exit keeps puts O(1)")
+        with self.assertRaises(ValueError):
+            t.size()
+        with self.assertRaises(ValueError):
+            t.height()
+
+    def test_walk_counted(self):
+        t, leaf = self.chain(1000, sizes=True)
+        t.put(leaf, t.new_node(0))
+        assert_equal(t.last_touched, 1000, "size walk up to the root")
+        assert_equal(t.size(), 1001, "size")
+
+
+class LazySizeTestCase(SizeTestCase):
+    kwargs = {"lazy": True, "sizes": True}
+
+
+class SegmentSizeTestCase(SizeTestCase):
+    kwargs = {"child_index": "segment", "sizes": True}
+
+
+class EulerSizeTestCase(SizeTestCase):
+    kwargs = {"backend": "euler", "sizes": True}
+    exact_height = True
+
+
+class ThreadSafeSizeTestCase(SizeTestCase):
+    kwargs = {"threadsafe": True, "sizes": True}
+
+
+class PersistentSizeTestCase(SizeTestCase):
+    kwargs = {"persistent": True, "sizes": True}
+
+
+class JournalSizeTestCase(unittest.TestCase):
+    def test_rollback_restores_sizes(self):
+        for kwargs in ({"sizes": True}, {"lazy": True, "sizes": True}):
+            rng = random.Random(7)
+            t = tree.Tree.from_parent_array(
+                list(range(100)), [-1] + [rng.randrange(i) for i in range(1, 100)],
+                operator.add, **kwargs)
+            sizes = [(n, n.subtree_size) for n in nodes_of(t)]
+            checkpoint = t.checkpoint()
+
+            t.flatten(t.root.children[0], operator.add)
+            t.put(t.root.children[-1], t.new_node(5))
+            t.flatten(t.root, operator.add)
+            t.rollback(checkpoint)
+
+            assert_equal(t.size(), 100, "size restored")
+            for n, size in sizes:
+                assert_equal(n.subtree_size, size, "subtree size restored")
+
+
+if __name__ == '__main__':
+    unittest.main()
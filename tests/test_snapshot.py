@@ -0,0 +1,91 @@
+import unittest
+import operator
+import os
+import random
+import tempfile
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(8)
+        self.keys = [rng.randint(-1 << 40, 1 << 40) for _ in range(500)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, 500)]
+        fd, self.path = tempfile.mkstemp(suffix=".snap")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def nodes(self, t):
+        nodes = [t.root]
+        for n in nodes:
+            nodes.extend(n.children)
+        return nodes
+
+    def test_round_trip(self):
+        for fn in (max, operator.xor):
+            original = tree.Tree.from_parent_array(self.keys, self.parents, fn)
+            original.save(self.path)
+
+            for use_mmap in (True, False):
+                loaded = tree.Tree.load(self.path, fn, mmap=use_mmap,
+                                        verify=True)
+                for a, b in zip(self.nodes(original), self.nodes(loaded)):
+                    assert_equal(b.key, a.key, "key")
+                    assert_equal(b.subtree_value, a.subtree_value, "value")
+                    assert_equal(len(b.children), len(a.children), "degree")
+
+    def test_loaded_tree_updates(self):
+        original = tree.Tree.from_parent_array(self.keys, self.parents,
+                                               operator.xor)
+        original.save(self.path)
+        loaded = tree.Tree.load(self.path, operator.xor, child_index="auto")
+        assert_equal(loaded.child_index, "inverse", "passed to the constructor")
+
+        node = self.nodes(loaded)[123]
+        loaded.put(node, loaded.new_node(77))
+        expected = original.root.subtree_value ^ 77
+        assert_equal(loaded.root.subtree_value, expected, "root after put")
+
+    def test_euler_backend(self):
+        original = tree.Tree.from_parent_array(self.keys, self.parents, max)
+        original.save(self.path)
+        loaded = tree.Tree.load(self.path, max, backend="euler")
+        assert_equal(loaded.root.subtree_value, max(self.keys), "root")
+
+    def test_values_are_trusted(self):
+        original = tree.Tree.from_parent_array(self.keys, self.parents, max)
+        original.root.subtree_value = 5
+        original.save(self.path)
+
+        loaded = tree.Tree.load(self.path, max)
+        assert_equal(loaded.root.subtree_value, 5, "stored value kept")
+        with self.assertRaises(ValueError):
+            tree.Tree.load(self.path, max, verify=True)
+
+    def test_bad_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot at all, really")
+        with self.assertRaises(ValueError):
+            tree.Tree.load(self.path, max)
+
+        original = tree.Tree.from_parent_array(self.keys, self.parents, max)
+        original.save(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 8)
+        with self.assertRaises(ValueError):
+            tree.Tree.load(self.path, max)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import operator
+import threading
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = tree.Tree(operator.add)
+        self.tree.create_root(1)
+
+    def test_counts_operations(self):
+        t = self.tree
+        calls = []
+        stats = t.enable_stats(lambda name, seconds, touched:
+                               calls.append((name, touched)))
+
+        a = t.new_node(2)
+        b = t.new_node(3)
+        c = t.new_node(4)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        t.put(a, c)
+        t.swap(c, b)
+        t.flatten(a, operator.add)
+
+        assert_equal(stats.operations,
+                     {"put": 3, "swap": 1, "flatten": 1}, "operations")
+        assert_equal([name for name, _ in calls],
+                     ["put", "put", "put", "swap", "flatten"], "callback")
+        assert stats.fn_calls > 0, "aggregator calls are counted"
+        assert_equal(stats.flatten_nodes, 2, "a and its child")
+        assert_equal(stats.ancestors, sum(n for _, n in calls), "ancestors")
+        assert_equal(t.root.subtree_value, 10, "root subtree value")
+
+    def test_keeps_fast_paths(self):
+        t = self.tree
+        child = t.new_node(2)
+        t.put(t.root, child)
+        t.put(child, t.new_node(3))
+        stats = t.enable_stats()
+
+        calls = stats.fn_calls
+        assert_equal(t.subtree_aggregate(t.root, operator.add), 6, "sum")
+        assert_equal(stats.fn_calls, calls, "read from the root, no fold")
+
+        t.parallel_refold(workers=1)
+        assert_equal(t.root.subtree_value, 6, "refolded by a worker")
+
+        multi = tree.Tree({"sum": operator.add, "max": max})
+        multi.enable_stats()
+        multi.create_root(4)
+        multi.put(multi.root, multi.new_node(5))
+        assert_equal(multi.subtree_aggregate(multi.root, max), 5, "max part")
+
+    def test_disable_restores_tree(self):
+        t = self.tree
+        t.enable_stats()
+        t.disable_stats()
+
+        assert t.fn is operator.add, "aggregator is unwrapped"
+        assert "put" not in vars(t), "wrappers are removed"
+        assert t.stats is None, "stats are dropped"
+
+        t.put(t.root, t.new_node(5))
+        assert_equal(t.root.subtree_value, 6, "root subtree value")
+
+    def test_counts_threads(self):
+        t = tree.Tree(operator.add, threadsafe=True)
+        t.create_root(0)
+        stats = t.enable_stats()
+        count = 2000
+
+        def run():
+            for _ in range(count):
+                t.put(t.root, t.new_node(1))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_equal(stats.operations["put"], 4 * count, "every put is counted")
+        assert_equal(t.root.subtree_value, 4 * count, "root subtree value")
+
+
+if __name__ == '__main__':
+    unittest.main()
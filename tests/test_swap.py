@@ -0,0 +1,92 @@
+import unittest
+import operator
+import random
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def recompute(node):
+    """
+    Reference subtree value, folded from scratch.
+    """
+    value = node.key
+    for child in node.children:
+        value = max(value, recompute(child))
+    return value
+
+
+class SwapTestCase(unittest.TestCase):
+
+    def check_slots(self, t):
+        stack = [t.root]
+        while stack:
+            n = stack.pop()
+            for slot, child in enumerate(n.children):
+                assert child.parent is n, "child points at its parent"
+                assert_equal(child.slot, slot, "child slot")
+            stack.extend(n.children)
+
+    def test_random_swaps_keep_values(self):
+        rng = random.Random(11)
+        for child_index in (None, "segment"):
+            keys = [rng.randint(0, 1000) for _ in range(200)]
+            parents = [-1] + [rng.randrange(min(i, 8)) for i in range(1, 200)]
+            t = tree.Tree.from_parent_array(keys, parents, max,
+                                            child_index=child_index)
+            nodes = []
+            stack = [t.root]
+            while stack:
+                n = stack.pop()
+                nodes.append(n)
+                stack.extend(n.children)
+
+            # only swap leaves so neither node is an ancestor of the other
+            leaves = [n for n in nodes if n.is_external()]
+            for _ in range(100):
+                a, b = rng.sample(leaves, 2)
+                t.swap(a, b)
+                assert_equal(t.root.subtree_value, recompute(t.root), "root")
+
+            self.check_slots(t)
+            for n in nodes:
+                assert_equal(n.subtree_value, recompute(n), "subtree value")
+
+    def test_sibling_swap_stays_local(self):
+        t = tree.Tree(max)
+        t.create_root(0)
+        children = [t.new_node(i) for i in range(1000)]
+        for c in children:
+            t.put(t.root, c)
+
+        t.swap(children[3], children[900])
+        assert_equal(t.root.children[3], children[900], "slot 3")
+        assert_equal(t.root.children[900], children[3], "slot 900")
+        assert_equal(t.last_touched, 1, "only the shared parent")
+
+    def test_put_moves_attached_node(self):
+        t = tree.Tree(operator.add, child_index="inverse", inverse=operator.sub)
+        t.create_root(0)
+        a = t.new_node(1)
+        b = t.new_node(2)
+        c = t.new_node(10)
+        t.put(t.root, a)
+        t.put(t.root, b)
+        t.put(a, c)
+        t.put(b, c)
+
+        assert_equal(len(a.children), 0, "node a children")
+        assert_equal(a.subtree_value, 1, "node a subtree value")
+        assert_equal(b.subtree_value, 12, "node b subtree value")
+        assert_equal(t.root.subtree_value, 13, "root subtree value")
+        self.check_slots(t)
+
+
+if __name__ == '__main__':
+    unittest.main()
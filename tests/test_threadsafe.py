@@ -0,0 +1,191 @@
+import unittest
+import operator
+import random
+import sys
+import threading
+import locking
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def fold_all(n, fn):
+    # recompute every subtree value from scratch, children first
+    order = [n]
+    for x in order:
+        order.extend(x.children)
+    values = {}
+    for x in reversed(order):
+        value = x.key
+        for c in x.children:
+            value = fn(value, values[c])
+        values[x] = value
+    return values
+
+
+class ThreadSafeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.interval = sys.getswitchinterval()
+        # switch threads as often as possible to shake out races
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def run_threads(self, target, count):
+        errors = []
+
+        def run(i):
+            try:
+                target(i)
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+    def check(self, t, fn):
+        for n, value in fold_all(t.root, fn).items():
+            assert_equal(n.subtree_value, value, "subtree value")
+
+    def test_constructor(self):
+        t = tree.Tree(operator.add, threadsafe=True)
+        assert isinstance(t, locking.ThreadSafeTree), "dispatched"
+        assert_equal(t.child_index, None, "no child index")
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, threadsafe=True, lazy=True)
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, threadsafe=True, child_index="segment")
+        with self.assertRaises(ValueError):
+            tree.Tree(operator.add, threadsafe=True, backend="euler")
+        with self.assertRaises(ValueError):
+            with t.batch():
+                pass
+
+    def test_concurrent_puts(self):
+        for fn in (operator.add, max):
+            t = tree.Tree(fn, threadsafe=True)
+            t.create_root(0)
+            hubs = [t.new_node(i) for i in range(4)]
+            for h in hubs:
+                t.put(t.root, h)
+
+            def work(i):
+                rng = random.Random(i)
+                mine = [hubs[i % 4]]
+                for _ in range(300):
+                    child = t.new_node(rng.randint(0, 1000))
+                    t.put(rng.choice(mine), child)
+                    mine.append(child)
+
+            self.run_threads(work, 8)
+            self.check(t, fn)
+
+    def test_concurrent_moves_and_swaps(self):
+        rng = random.Random(11)
+        n = 400
+        keys = [rng.randint(0, 1000) for _ in range(n)]
+        parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        t = tree.Tree.from_parent_array(keys, parents, operator.add,
+                                        threadsafe=True)
+        nodes = [t.root]
+        for x in nodes:
+            nodes.extend(x.children)
+        leaves = [x for x in nodes if x.is_external()]
+
+        # each thread owns its own leaves and only ever moves those, onto
+        # parents that stay inner nodes
+        inner = [x for x in nodes if not x.is_external()]
+
+        def work(i):
+            r = random.Random(i)
+            own = leaves[i::6]
+            for _ in range(200):
+                if r.random() < 0.5:
+                    t.put(r.choice(inner), r.choice(own))
+                else:
+                    a, b = r.sample(own, 2)
+                    t.swap(a, b)
+
+        self.run_threads(work, 6)
+        self.check(t, operator.add)
+        assert_equal(t.root.subtree_value, sum(keys), "total")
+
+    def test_parallel_flatten(self):
+        t = tree.Tree(operator.add, threadsafe=True, sizes=True)
+        t.create_root(1)
+        child = t.new_node(2)
+        t.put(t.root, child)
+        t.put(child, t.new_node(3))
+        t.parallel_flatten(child, operator.mul, workers=1)
+        assert_equal(child.key, 6, "flattened key")
+        assert_equal(t.root.subtree_value, 7, "refolded")
+        assert_equal(t.size(), 2, "resized")
+        assert_equal(getattr(t._pending, "resized", []), [], "nothing left")
+
+    def test_parallel_refold(self):
+        t = tree.Tree(operator.add, threadsafe=True)
+        t.create_root(1)
+        child = t.new_node(2)
+        t.put(t.root, child)
+        refolded = threading.Event()
+
+        def refold():
+            t.parallel_refold(workers=1)
+            refolded.set()
+
+        refolder = threading.Thread(target=refold)
+        with t.consistent():
+            refolder.start()
+            # waits for the reader, whose values must not change under it
+            assert_equal(refolded.wait(0.5), False, "refold waits")
+            assert_equal(t.root.subtree_value, 3, "root inside the block")
+        refolder.join()
+        assert_equal(refolded.is_set(), True, "refold ran after the block")
+
+        t.put(child, t.new_node(3))
+        assert_equal(t.root.subtree_value, 6, "writers run again")
+
+    def test_consistent_reads(self):
+        t = tree.Tree(operator.add, threadsafe=True)
+        t.create_root(0)
+        left = t.new_node(0)
+        right = t.new_node(0)
+        t.put(t.root, left)
+        t.put(t.root, right)
+        done = threading.Event()
+
+        def writer(i):
+            # every put adds 1 under left and 1 under right, so inside a
+            # consistent view the two sides only ever differ by one put
+            while not done.is_set():
+                t.put(left, t.new_node(1))
+                t.put(right, t.new_node(1))
+
+        def reader(i):
+            for _ in range(200):
+                with t.consistent():
+                    a = left.subtree_value
+                    b = right.subtree_value
+                    total = t.root.subtree_value
+                assert_equal(total, a + b, "root matches its children")
+            done.set()
+
+        self.run_threads(lambda i: reader(i) if i == 0 else writer(i), 3)
+        self.check(t, operator.add)
+
+
+if __name__ == '__main__':
+    unittest.main()
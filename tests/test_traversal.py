@@ -0,0 +1,111 @@
+import unittest
+import operator
+import random
+import arraytree
+import traversal
+import tree
+
+
+def assert_equal(got, expected, msg):
+    """
+    Simple asset helper
+    """
+    assert expected == got, \
+        "[{}] Expected: {}, got: {}".format(msg, expected, got)
+
+
+def recursive_preorder(n, out):
+    out.append(n)
+    for c in n.children:
+        recursive_preorder(c, out)
+    return out
+
+
+def recursive_postorder(n, out):
+    for c in n.children:
+        recursive_postorder(c, out)
+    out.append(n)
+    return out
+
+
+class TraversalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(10)
+        n = 300
+        self.keys = [rng.randint(0, 1000) for _ in range(n)]
+        self.parents = [-1] + [rng.randrange(i) for i in range(1, n)]
+        self.tree = tree.Tree.from_parent_array(self.keys, self.parents, max)
+
+    def test_orders(self):
+        t = self.tree
+        assert_equal(list(t.iter_preorder()),
+                     recursive_preorder(t.root, []), "preorder")
+        assert_equal(list(t.iter_postorder()),
+                     recursive_postorder(t.root, []), "postorder")
+
+        levels = list(t.iter_levelorder())
+        depth = {t.root: 0}
+        for n in levels[1:]:
+            depth[n] = depth[n.parent] + 1
+        assert_equal(len(levels), len(self.keys), "level order count")
+        assert_equal([depth[n] for n in levels],
+                     sorted(depth[n] for n in levels), "level by level")
+
+        assert_equal(list(t.iter_leaves()),
+                     [n for n in recursive_preorder(t.root, [])
+                      if not n.children], "leaves")
+
+    def test_from_node(self):
+        inner = next(n for n in self.tree.iter_levelorder()
+                     if n.children and n.parent)
+        assert_equal(list(inner.iter_preorder()),
+                     recursive_preorder(inner, []), "node preorder")
+        assert_equal(list(self.tree.iter_postorder(inner)),
+                     recursive_postorder(inner, []), "subtree postorder")
+        assert_equal(list(inner.iter_leaves()),
+                     list(self.tree.iter_leaves(inner)), "node leaves")
+        assert_equal(set(inner.iter_levelorder()),
+                     set(inner.iter_preorder()), "node level order")
+
+    def test_prune(self):
+        threshold = 900
+        keep = lambda n: n.key >= threshold
+
+        def prune(value):
+            return value < threshold
+
+        for it in (self.tree.iter_preorder, self.tree.iter_postorder,
+                   self.tree.iter_levelorder):
+            got = list(it(prune=prune))
+            for n in got:
+                assert n.subtree_value >= threshold, "pruned subtree visited"
+            assert_equal(sorted(n.key for n in got if keep(n)),
+                         sorted(k for k in self.keys if k >= threshold),
+                         "every large key reached")
+
+        assert_equal(list(self.tree.iter_preorder(prune=lambda v: True)), [],
+                     "everything pruned")
+        assert_equal(list(self.tree.iter_postorder(prune=lambda v: True)), [],
+                     "everything pruned")
+
+    def test_deep_chain(self):
+        t = tree.Tree.from_parent_array(list(range(100000)),
+                                        list(range(-1, 99999)), operator.add)
+        assert_equal(sum(1 for _ in t.iter_preorder()), 100000, "preorder")
+        assert_equal(sum(1 for _ in t.iter_postorder()), 100000, "postorder")
+        assert_equal(next(t.iter_leaves()).key, 99999, "leaf")
+
+    def test_early_exit(self):
+        it = self.tree.iter_preorder()
+        first = [next(it) for _ in range(3)]
+        assert first[0] is self.tree.root, "root first"
+
+    def test_array_tree(self):
+        t = arraytree.ArrayTree.from_parent_array(self.keys, self.parents, max)
+        assert_equal([n.key for n in traversal.preorder(t.root)],
+                     [n.key for n in self.tree.iter_preorder()], "array tree")
+
+
+if __name__ == '__main__':
+    unittest.main()
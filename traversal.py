@@ -0,0 +1,92 @@
+"""
+Tree Traversals
+---------------
+
+Lazy iterators over the subtree rooted at a node, used by the iter_*
+methods of tree.Tree and node.Node.
+
+None of them recurse, so they work on trees of any height, and none of them
+builds a list of the nodes: the explicit stack or queue only holds the
+nodes still to be visited. Stopping early, e.g. breaking out of a for loop,
+costs nothing for the rest of the tree.
+
+Every iterator takes an optional prune predicate. A node for which
+prune(node.subtree_value) is true is skipped together with its whole
+subtree, e.g. prune=lambda v: v < threshold on a max tree visits only the
+parts of the tree holding a key of at least threshold.
+
+The tree must not be changed while an iterator over it is in use.
+"""
+
+from collections import deque
+
+
+def preorder(node, prune=None):
+    """
+    :param node: The root of the subtree.
+    :param prune: Optional predicate on subtree_value.
+    :return: Iterator over the subtree, each node before its children.
+    """
+    stack = [node]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        n = pop()
+        if prune is not None and prune(n.subtree_value):
+            continue
+        yield n
+        extend(reversed(n.children))
+
+
+def postorder(node, prune=None):
+    """
+    :param node: The root of the subtree.
+    :param prune: Optional predicate on subtree_value.
+    :return: Iterator over the subtree, each node after its children.
+    """
+    if prune is not None and prune(node.subtree_value):
+        return
+
+    # the path from node down to the current node, and for each of them
+    # the iterator over the children still to go; two flat stacks rather
+    # than one of pairs, which would give the cycle collector a tuple per
+    # level to track on deep trees
+    nodes = [node]
+    pending = [iter(node.children)]
+    while pending:
+        for c in pending[-1]:
+            if prune is None or not prune(c.subtree_value):
+                nodes.append(c)
+                pending.append(iter(c.children))
+                break
+        else:
+            pending.pop()
+            yield nodes.pop()
+
+
+def levelorder(node, prune=None):
+    """
+    :param node: The root of the subtree.
+    :param prune: Optional predicate on subtree_value.
+    :return: Iterator over the subtree, level by level.
+    """
+    queue = deque((node,))
+    popleft = queue.popleft
+    extend = queue.extend
+    while queue:
+        n = popleft()
+        if prune is not None and prune(n.subtree_value):
+            continue
+        yield n
+        extend(n.children)
+
+
+def leaves(node, prune=None):
+    """
+    :param node: The root of the subtree.
+    :param prune: Optional predicate on subtree_value.
+    :return: Iterator over the leaves of the subtree, left to right.
+    """
+    for n in preorder(node, prune):
+        if not n.children:
+            yield n
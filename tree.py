@@ -1,86 +1,1108 @@
+import contextlib
+import functools
+import weakref
+
 import node
+import aggregators
+import childindex
+import ingest
+import journal
+import parallel
+import snapshot
+import stats
+import traversal
+
+def reduce_keys(fn, keys):
+    """
+    Folds fn over a non-empty list of keys, in a single call for the
+    aggregators registered in aggregators.py.
+    :param fn: The aggregating function.
+    :param keys: The keys to fold.
+    :return: The aggregate.
+    """
+    aggregator = aggregators.lookup(fn)
+    if aggregator is not None:
+        return aggregator.reduce(keys)
+    return functools.reduce(fn, keys)
 
 class Tree:
-    def __init__(self, fn):
+    def __new__(cls, *args, backend=None, threadsafe=False, persistent=False,
+                **kwargs):
+        # Tree(fn, backend="euler") hands out the Euler tour tree backend,
+        # Tree(fn, threadsafe=True) the thread-safe tree and
+        # Tree(fn, persistent=True) the persistent one
+        if (backend == "euler") + bool(threadsafe) + bool(persistent) > 1:
+            raise ValueError("backend, threadsafe and persistent do not mix")
+        if backend == "euler" and cls is Tree:
+            import ett
+            cls = ett.EulerTourTree
+        elif threadsafe and cls is Tree:
+            import locking
+            cls = locking.ThreadSafeTree
+        elif persistent and cls is Tree:
+            import persistent as _persistent
+            cls = _persistent.PersistentTree
+        return super().__new__(cls)
+
+    def __init__(self, fn, child_index=None, inverse=None, lazy=False,
+                 backend=None, threadsafe=False, persistent=False,
+                 sizes=False, ids=False):
+        """
+        :param fn: The aggregating function, or a dict from names to
+        aggregating functions to maintain all of them in one pass, see
+        aggregators.fuse().
+        :param child_index: None to fold over node.children directly,
+        "segment" to keep a segment tree over each node's children,
+        "inverse" to keep a running aggregate updated through inverse, or
+        "auto" to use "inverse" when inverse is given or fn is registered
+        with an exact one, and None otherwise.
+        :param inverse: The inverse of fn, needed by "inverse" unless fn is
+        registered with one in aggregators.py.
+        :param lazy: If True, put, flatten and swap only mark the changed
+        path dirty and subtree values are recomputed when they are read.
+        :param backend: None for this tree, "euler" for ett.EulerTourTree.
+        :param threadsafe: True for locking.ThreadSafeTree, which can be
+        shared by threads.
+        :param persistent: True for persistent.PersistentTree, which keeps
+        versions of itself for snapshot().
+        :param sizes: If True, every node counts its subtree, see size().
+        Each put, swap and flatten then walks up to the root.
+        :param ids: If True, nodes can be given external ids, see get().
+        """
+        if threadsafe or persistent:
+            raise ValueError("use Tree(fn, threadsafe=True) or "
+                             "Tree(fn, persistent=True) to make those trees")
+        if backend not in (None, "euler"):
+            raise ValueError("unknown backend {!r}".format(backend))
+        if child_index not in (None, "segment", "inverse", "auto"):
+            raise ValueError("unknown child index {!r}".format(child_index))
+
+        # several named aggregates are folded as one tuple per node
+        self.names = None
+        if isinstance(fn, dict):
+            fn = aggregators.fuse(fn)
+            self.names = fn.names
+
+        # known aggregators get their fast paths: an inverse for O(1)
+        # child indexes, a builtin reduce for refolds and an O(1) update
+        # per ancestor on put when fn is idempotent
+        aggregator = aggregators.lookup(fn)
+        if child_index == "auto":
+            exact = inverse is not None or (aggregator is not None and
+                                            aggregator.exact)
+            child_index = "inverse" if exact else None
+        if inverse is None and aggregator is not None:
+            inverse = aggregator.inverse
+        if child_index == "inverse" and inverse is None:
+            raise ValueError("inverse child index needs an inverse function")
+
+        self.aggregator = aggregator
+        self._identity = None if aggregator is None else aggregator.identity
+        self._reduce = None if aggregator is None else aggregator.reduce
+        self._absorbs = aggregator is not None and aggregator.idempotent
+
         self.fn = fn
         self.root = None
+        self.child_index = child_index
+        self.inverse = inverse
+        self.lazy = lazy
+        self.sizes = sizes
+        self.ids = ids
+        self._node_class = node.node_class(sizes, lazy, ids)
+
+        # number of nodes refolded (marked dirty in lazy mode) by the last put/flatten/swap
+        self.last_touched = 0
+
+        # ancestors walked by _resize in the current operation, counted in
+        # last_touched
+        self._walked = 0
+
+        # binary lifting tables for lca queries, only for nodes that were
+        # asked about and their ancestors: (depth, up, path) where up[k] is
+        # the 2^k-th ancestor and path[k] the aggregate of the keys on the
+        # way there, up to but without up[k]. Dropped when they go stale.
+        self._lifts = {}
+
+        # nodes whose children changed inside batch(), None outside of it
+        self._dirty = None
+
+        # counters while instrumented, see enable_stats()
+        self.stats = None
+
+        # undo log while enabled, see enable_journal()
+        self._journal = None
+
+        # external ids of the nodes, see get(); weak so nodes no longer
+        # referenced anywhere else drop out on their own
+        self._ids = weakref.WeakValueDictionary()
+        self._named = False
+
+    @classmethod
+    def from_parent_array(cls, keys, parents, fn, **kwargs):
+        """
+        Builds a whole tree at once. All nodes are linked first and every
+        subtree value is then computed in a single bottom-up pass, O(N)
+        overall instead of one bubble up per put.
+        :param keys: The key of each node.
+        :param parents: The position in keys of each node's parent, -1 or
+        None for the root.
+        :param fn: The aggregating function.
+        :param kwargs: Passed on to the constructor.
+        :return: The new tree.
+        """
+        tree = cls(fn, **kwargs)
+        nodes, order = tree._link_parents(keys, parents)
+        tree._bulk_fold(order)
+        return tree
+
+    @classmethod
+    def ingest(cls, source, fn, chunk_size=ingest.CHUNK_SIZE, ids=False,
+               pause_gc=False, **kwargs):
+        """
+        Builds a tree from a stream of (parent_id, child_id, key) records
+        in any order, computing subtree values in one pass at the end. See
+        ingest.py for the accepted file formats.
+        :param source: An iterable of records, or the path of a JSON lines
+        or edge list file.
+        :param fn: The aggregating function.
+        :param chunk_size: The number of records read at a time.
+        :param ids: If True, every node is registered under its child_id,
+        see get().
+        :param pause_gc: If True, the cycle collector is off while records
+        are linked, for the whole process; see ingest.py.
+        :param kwargs: Passed on to the constructor.
+        :return: The new tree.
+        """
+        return ingest.ingest(cls, source, fn, chunk_size, ids, pause_gc,
+                             **kwargs)
 
-    def create_root(self, root_key):
+    @classmethod
+    def load(cls, path, fn, mmap=True, verify=False, **kwargs):
+        """
+        Loads a tree written by save(). The stored subtree values are used
+        as they are, without refolding. See snapshot.py.
+        :param path: The snapshot file.
+        :param fn: The aggregating function the snapshot was written with.
+        :param mmap: If True, read the columns straight from a memory map of
+        the file instead of reading it into memory first.
+        :param verify: If True, refold every node and raise ValueError if a
+        stored subtree value does not match.
+        :param kwargs: Passed on to the constructor.
+        :return: The new tree.
+        """
+        return snapshot.load(cls, path, fn, mmap, verify, **kwargs)
+
+    def save(self, path):
+        """
+        Writes the tree to a binary snapshot: a fixed header and int64
+        columns of keys, parent positions and subtree values. Keys and
+        subtree values must fit in a signed 64 bit integer.
+        :param path: The file to write.
+        """
+        snapshot.save(self, path)
+
+    def create_root(self, root_key, id=None):
         assert self.root == None, "cannot create root in non-empty tree"
-        self.root = self.new_node(root_key)
+        self.root = self.new_node(root_key, id)
+
+    def new_node(self, key, id=None):
+        if self.names is not None:
+            key = self._key(key)
+        n = self._node_class(key)
+        if id is not None:
+            self._register(n, id)
+        return n
+
+    def get(self, id, default=None):
+        """
+        Finds a node by the id it was created with, in O(1).
+        :param id: The external id given to new_node or create_root.
+        :param default: Returned when no node has that id.
+        :return: The node, or default once the node was discarded by
+        flatten or freed.
+        """
+        return self._ids.get(id, default)
 
-    def new_node(self, key):
-        return node.Node(key)
+    def __contains__(self, id):
+        """
+        :return: True if a node with this id is registered, see get().
+        """
+        return id in self._ids
 
     def put(self, parent, child):
-        parent.children.append(child) # add child to the list of children
-        child.parent = parent #  connect child to parent
+        # a node sits in one children list only, putting an attached node
+        # moves it
+        old_parent = child.parent
+        if self._named and child.id is not None and \
+                self._ids.get(child.id) is not child:
+            # e.g. a node cut off by flatten being put back
+            self._register(child, child.id)
+        if self._journal is not None:
+            self._journal.append(("put", child, old_parent, child.slot))
+        self._walked = 0
+        if old_parent is not None:
+            self._detach(old_parent, child)
 
-        self.update_subtree(parent)
+        self._attach(parent, child)
+
+        if old_parent is None and self._absorbs and not self.lazy \
+                and self._dirty is None:
+            self.last_touched = self._absorb(parent, child.subtree_value)
+        else:
+            self.last_touched = self._changed(parent, old_parent)
+        if self._walked > self.last_touched:
+            self.last_touched = self._walked
 
     def flatten(self, node, fn):
         if node.is_external():
             return node;
 
-        # operate on each children
-        result = node.key
+        if isinstance(fn, dict):
+            fn = aggregators.fuse(fn)
+        result = reduce_keys(fn, self._subtree_keys(node))
+        return self._flatten_to(node, result)
 
-        # find the last child
-        for c in node.children:
-            cursor = c
-            result = fn(result, cursor.key)
+    def parallel_flatten(self, node, fn, workers=None):
+        """
+        flatten() with the keys of the subtree reduced by a pool of worker
+        processes, for subtrees of millions of nodes. See parallel.py.
+        :param node: The root of the subtree.
+        :param fn: A picklable aggregating function.
+        :param workers: The number of processes, os.cpu_count() by default.
+        :return: node
+        """
+        if node.is_external():
+            return node
+        return self._flatten_to(node, parallel.reduce_keys(
+            fn, self._subtree_keys(node), workers))
+
+    def parallel_refold(self, workers=None):
+        """
+        Recomputes every subtree value from scratch, with disjoint subtrees
+        of roughly equal size folded by a pool of worker processes and the
+        rest of the tree folded here. See parallel.py.
+        :param workers: The number of processes, os.cpu_count() by default.
+        """
+        parallel.refold(self, workers)
+
+    def _flatten_to(self, node, result):
+        if self._journal is not None:
+            self._journal.append(("flatten", node, node.key, node.children,
+                                  node.child_index))
+
+        removed = node.subtree_size - 1 if self.sizes else 0
+        if self._named:
+            self._forget(node)
+        if self._lifts:
+            # the key changed, so the path aggregates of node are stale,
+            # and those of the discarded descendants with them
+            self._unlift(node)
 
-            while not cursor.is_external():
-                for c in cursor.children:
-                    cursor = c
-                    result = fn(result, cursor.key)
+        # cut the old children off and update node key
+        for c in node.children:
+            c.parent = None
+            c.slot = None
 
-        # update node key
+        if node._dirty:
+            node._dirty = False
         node.key = result
-        node.subtree_value = result
         node.children = []
+        node.child_index = None
+        if self.sizes:
+            node._size = 1
+            node._height = 0
+            node._grown = 0
+        self._store(node, result)
 
+        self.last_touched = 0
         if node.parent != None:
-            self.update_subtree(node.parent)
+            self._walked = 0
+            if removed:
+                self._resize(node.parent, -removed)
+            self.last_touched = max(self._changed(node.parent), self._walked)
 
         return node;
 
     def swap(self, node_a, node_b):
+        self.last_touched = 0
         if node_a == node_b:
             return;
 
-        # update subtree_value from swapping item onwards to its key
-        cursor1 = node_a
-        while cursor1.parent != None:
-            cursor1.subtree_value = cursor1.key
-            cursor1 = cursor1.parent
-
-        cursor2 = node_b
-        while cursor2.parent != None:
-            cursor2.subtree_value = cursor2.key
-            cursor2 = cursor2.parent
+        if self._journal is not None:
+            self._journal.append(("swap", node_a, node_b))
 
         a_parent = node_a.parent
         b_parent = node_b.parent
+        a_slot = node_a.slot
+        b_slot = node_b.slot
+
+        # read the values before relinking, in lazy mode a read may refresh
+        # the node and update the index of the parent it is linked to
+        a_value = node_a.subtree_value
+        b_value = node_b.subtree_value
+        if self.sizes:
+            grown = node_a.subtree_size - node_b.subtree_size
+
+        # each node takes over the other's slot, O(1) for any degree
+        a_parent.children[a_slot] = node_b
+        b_parent.children[b_slot] = node_a
+        node_a.parent, node_a.slot = b_parent, b_slot
+        node_b.parent, node_b.slot = a_parent, a_slot
+        self._walked = 0
+        if a_parent is not b_parent:
+            self._moved()
+            if self.sizes:
+                self._resize(b_parent, grown, node_a._height)
+                self._resize(a_parent, -grown, node_b._height)
 
-        # clear connect between swapping item and their parents
-        node_a.parent = None;
-        node_b.parent = None;
-        a_parent.children.remove(node_a)
-        b_parent.children.remove(node_b)
+        if a_parent.child_index is not None:
+            a_parent.child_index.replace(a_slot, a_value, b_value)
+        if b_parent.child_index is not None:
+            b_parent.child_index.replace(b_slot, b_value, a_value)
 
-        # connect swapping item connect to tree
-        self.put(b_parent, node_a)
-        self.put(a_parent, node_b)
+        self.last_touched = max(self._changed(a_parent, b_parent),
+                                self._walked)
 
-        self.update_subtree(node_a)
-        self.update_subtree(node_b)
+    def enable_stats(self, callback=None):
+        """
+        Starts counting aggregator calls, refolded ancestors, flattened
+        nodes and detaches, and timing put/flatten/swap/update_subtree.
+        Costs nothing until called, see stats.py.
+        :param callback: Called as callback(name, seconds, touched) after
+        each operation, or None.
+        :return: The stats.TreeStats being filled, also kept as tree.stats.
+        """
+        self.disable_stats()
+        self.stats = stats.TreeStats(callback)
+        stats.instrument(self, self.stats)
+        return self.stats
+
+    def disable_stats(self):
+        """
+        Stops instrumentation and removes its wrappers.
+        """
+        if self.stats is not None:
+            stats.uninstrument(self)
+            self.stats = None
+
+    def enable_journal(self, limit=None):
+        """
+        Starts recording put, swap and flatten in an undo log, so that
+        rollback() can invert them. See journal.py.
+        :param limit: The most operations to keep, the oldest are dropped
+        first. None for no limit.
+        """
+        self._journal = journal.Journal(limit)
+
+    def disable_journal(self):
+        """
+        Stops recording and drops the undo log.
+        """
+        self._journal = None
+
+    def checkpoint(self):
+        """
+        Marks the current state to roll back to later, enabling the journal
+        without a limit if it is not on yet.
+        :return: The checkpoint, for rollback().
+        """
+        if self._journal is None:
+            self.enable_journal()
+        return self._journal.count
+
+    def rollback(self, to):
+        """
+        Undoes every put, swap and flatten made since a checkpoint, in time
+        proportional to those changes rather than to the size of the tree.
+        :param to: A checkpoint from checkpoint().
+        """
+        if self._journal is None:
+            raise ValueError("the journal is not enabled")
+
+        # undoing must not record anything itself
+        log = self._journal
+        self._journal = None
+        try:
+            touched = journal.rollback(self, log, to)
+        finally:
+            self._journal = log
+        self.last_touched = touched
+
+    def truncate_journal(self, before=None):
+        """
+        Drops journal entries to free memory. Checkpoints taken before the
+        given one can no longer be rolled back to.
+        :param before: A checkpoint, None to drop every entry.
+        """
+        if self._journal is not None:
+            self._journal.truncate(before)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defers the refolding of put, flatten and swap until the block exits.
+
+            with tree.batch():
+                tree.put(a, b)
+                tree.swap(c, d)
+
+        Subtree values are only consistent again once the block exits. On
+        exit every ancestor of a changed node is refolded at most once,
+        children before parents, so ancestors shared by many mutations are
+        paid for once. Nested blocks are flushed by the outermost one.
+        """
+        if self._dirty is not None:
+            yield self
+            return
+
+        self._dirty = []
+        try:
+            yield self
+        finally:
+            dirty = self._dirty
+            self._dirty = None
+            self.last_touched = self._flush(dirty)
+            self._refolded()
+
+    def lca(self, a, b):
+        """
+        Finds the lowest common ancestor of two nodes with binary lifting.
+        Lifting tables are built on demand and reused until a move makes
+        them stale, so repeated queries on a stable tree cost O(log n).
+        :param a: A node of the tree.
+        :param b: Another node of the tree.
+        :return: The deepest node that is an ancestor of both, which may be
+        a or b itself, or None if they are in different trees.
+        """
+        lifts = self._lifts
+        a_depth = self._lift(a)[0]
+        b_depth = self._lift(b)[0]
+
+        if a_depth < b_depth:
+            a, b = b, a
+
+        # bring a up to the depth of b
+        diff = abs(a_depth - b_depth)
+        k = 0
+        while diff:
+            if diff & 1:
+                a = lifts[a][1][k]
+            diff >>= 1
+            k += 1
+
+        if a is b:
+            return a
+
+        # climb both as far as their ancestors still differ
+        a_up = lifts[a][1]
+        b_up = lifts[b][1]
+        for k in range(len(a_up) - 1, -1, -1):
+            if k < len(a_up) and a_up[k] is not b_up[k]:
+                a = a_up[k]
+                b = b_up[k]
+                a_up = lifts[a][1]
+                b_up = lifts[b][1]
+
+        return a.parent
+
+    def kth_ancestor(self, node, k):
+        """
+        Finds the ancestor k levels above node with binary lifting, in
+        O(log n) time while the lifting tables are fresh (see lca()).
+        :param node: A node of the tree.
+        :param k: The number of levels to climb, 0 for node itself.
+        :return: The ancestor, or None if node has fewer than k ancestors.
+        """
+        if k < 0:
+            raise ValueError("k must not be negative")
+
+        if k > self._lift(node)[0]:
+            return None
+
+        lifts = self._lifts
+        i = 0
+        while k:
+            if k & 1:
+                node = lifts[node][1][i]
+            k >>= 1
+            i += 1
+        return node
+
+    def depth(self, node):
+        """
+        The number of edges between node and the root of its tree, from
+        the binary lifting tables, in O(log n) time while they are fresh
+        (see lca()).
+        :param node: A node of the tree.
+        :return: The depth, 0 for the root.
+        """
+        return self._lift(node)[0]
+
+    def size(self):
+        """
+        The number of nodes reachable from the root, kept up to date by
+        put, swap and flatten in trees built with sizes=True, so O(1).
+        :return: The size, 0 for an empty tree.
+        """
+        self._need_sizes()
+        return 0 if self.root is None else self.root.subtree_size
+
+    def height(self):
+        """
+        An O(1) estimate of the number of edges on the longest path down
+        from the root. It is exact as long as nothing was taken out of the
+        tree; moving or flattening subtrees can leave it too high, never
+        too low.
+        Needs sizes=True.
+        :return: The estimate, 0 for an empty tree or a lone root.
+        """
+        self._need_sizes()
+        if self.root is None:
+            return 0
+        return min(self.root._height, self.root.subtree_size - 1)
+
+    def path_aggregate(self, a, b):
+        """
+        Folds fn over the keys on the path between two nodes, both ends
+        included, in O(log n) time while the lifting tables are fresh.
+        :param a: A node of the tree.
+        :param b: Another node of the tree, e.g. the root for the aggregate
+        along a root-to-node path.
+        :return: The aggregate of the path.
+        """
+        top = self.lca(a, b)
+        if top is None:
+            raise ValueError("nodes are in different trees")
+
+        lifts = self._lifts
+        top_depth = lifts[top][0]
+        value = self._fold_up(a, lifts[a][0] - top_depth, top.key)
+        return self._fold_up(b, lifts[b][0] - top_depth, value)
+
+    def subtree_aggregate(self, node, fn):
+        """
+        Folds fn over the keys of the subtree rooted at node without
+        changing the tree, the non-destructive counterpart of flatten.
+        This is O(1) when fn is the tree's function, or one of the
+        functions of a multi-aggregate tree, and a single traversal of the
+        subtree otherwise.
+        :param node: The root of the subtree.
+        :param fn: The aggregating function.
+        :return: The aggregate.
+        """
+        # the unwrapped fn while stats are counting its calls
+        own = getattr(self, "_raw_fn", self.fn)
+        if fn is own:
+            return node.subtree_value
+        if self.names is not None:
+            for name, part in zip(self.names, own.parts):
+                if part is fn:
+                    return node.subtree_value[name]
+        return reduce_keys(fn, self._subtree_keys(node))
+
+    def iter_preorder(self, node=None, prune=None):
+        """
+        Iterates over a subtree, each node before its children, without
+        recursion. See traversal.py.
+        :param node: The root of the subtree, the tree's root by default.
+        :param prune: Optional predicate on subtree_value, nodes for which
+        it is true are skipped with their whole subtree.
+        :return: Iterator over the nodes.
+        """
+        return traversal.preorder(self.root if node is None else node, prune)
+
+    def iter_postorder(self, node=None, prune=None):
+        """
+        Like iter_preorder, but each node comes after its children.
+        """
+        return traversal.postorder(self.root if node is None else node, prune)
+
+    def iter_levelorder(self, node=None, prune=None):
+        """
+        Like iter_preorder, but level by level from the top.
+        """
+        return traversal.levelorder(self.root if node is None else node, prune)
+
+    def iter_leaves(self, node=None, prune=None):
+        """
+        Like iter_preorder, but only yields the leaves.
+        """
+        return traversal.leaves(self.root if node is None else node, prune)
 
     def update_subtree(self, node):
-        node.subtree_value = node.key
+        """
+        Refolds the subtree_value of node and then of each of its ancestors.
+        The walk is iterative and stops at the first node whose
+        subtree_value comes out unchanged, since nothing above it can change.
+        :param node: The lowest node whose children changed.
+        :return: The number of nodes that were refolded.
+        """
+        touched = 0
 
-        for child in node.children:
-            node.subtree_value = self.fn(node.subtree_value, child.subtree_value)
+        while node is not None:
+            touched += 1
 
-        if node.parent != None:
-            self.update_subtree(node.parent)
+            value = self._fold(node)
+            if value == node.subtree_value:
+                break
+
+            self._store(node, value)
+            node = node.parent
+
+        return touched
+
+    def _link_parents(self, keys, parents):
+        # link nodes for keys as described by a parent array
+        if len(keys) != len(parents):
+            raise ValueError("keys and parents differ in length")
+
+        nodes = [self.new_node(key) for key in keys]
+
+        for child, p in zip(nodes, parents):
+            if p is None or p < 0:
+                if self.root is not None:
+                    raise ValueError("parent array has more than one root")
+                self.root = child
+                continue
+
+            parent = nodes[p]
+            child.slot = len(parent.children)
+            parent.children.append(child)
+            child.parent = parent
+
+        if self.root is None:
+            raise ValueError("parent array has no root")
+
+        # breadth first order puts every parent before its children, so
+        # walking it backwards handles each child before its parent
+        order = [self.root]
+        for n in order:
+            order.extend(n.children)
+        if len(order) != len(nodes):
+            raise ValueError("parent array does not describe a single tree")
+
+        return nodes, order
+
+    def _bulk_trust(self, order):
+        # subtree values of a freshly linked tree were set from a snapshot,
+        # only the child indexes and sizes still need building
+        if self.sizes:
+            self._bulk_count(order)
+        if self.child_index is not None:
+            for n in order:
+                if n.children:
+                    n.child_index = self._new_index(
+                        c.subtree_value for c in n.children)
+
+    def _bulk_fold(self, order):
+        # compute every subtree value of a freshly linked tree, order lists
+        # every node after its parent
+        for n in reversed(order):
+            if self.child_index is not None and n.children:
+                n.child_index = self._new_index(c.subtree_value for c in n.children)
+            n.subtree_value = self._fold(n)
+        if self.sizes:
+            self._bulk_count(order)
+
+    def _bulk_count(self, order):
+        # exact sizes and heights of a freshly linked tree
+        for n in reversed(order):
+            p = n.parent
+            if p is not None:
+                p._size += n._size
+                if n._height >= p._height:
+                    p._height = n._height + 1
+
+    def _register(self, node, id):
+        if not self.ids:
+            raise ValueError("ids are only kept by Tree(fn, ids=True)")
+        known = self._ids.get(id)
+        if known is not None and known is not node:
+            raise ValueError("id {!r} is already in use".format(id))
+        node.id = id
+        self._ids[id] = node
+        self._named = True
+
+    def _forget(self, node):
+        # drop the ids of the descendants of node, which flatten discards
+        ids = self._ids
+        descendants = list(node.children)
+        for d in descendants:
+            descendants.extend(d.children)
+            if d.id is not None and ids.get(d.id) is d:
+                del ids[d.id]
+
+    def _unlift(self, node):
+        # drop the lifting tables of node and its descendants
+        lifts = self._lifts
+        lifts.pop(node, None)
+        descendants = list(node.children)
+        for d in descendants:
+            descendants.extend(d.children)
+            lifts.pop(d, None)
+
+    def _moved(self):
+        # a subtree changed place, which makes every table below it stale
+        if self._lifts:
+            self._lifts = {}
+
+    def _remember(self, node):
+        # register the descendants of node again, undoing _forget; they
+        # take their ids back from any node that got them since
+        ids = self._ids
+        descendants = list(node.children)
+        for d in descendants:
+            descendants.extend(d.children)
+            if d.id is not None:
+                ids[d.id] = d
+
+    def _subtree_keys(self, node):
+        # breadth first over the subtree without recursion, each node
+        # visited exactly once
+        descendants = list(node.children)
+        extend = descendants.extend
+        for cursor in descendants:
+            extend(cursor.children)
+
+        keys = [cursor.key for cursor in descendants]
+        keys.append(node.key)
+        return keys
+
+    def _key(self, key):
+        # in a multi-aggregate tree every aggregate starts from the key,
+        # unless a tuple gives one key per aggregate
+        if not isinstance(key, tuple):
+            key = [key] * len(self.names)
+        elif len(key) != len(self.names):
+            raise ValueError("expected {} keys, got {}".format(
+                len(self.names), len(key)))
+        return getattr(self, "_raw_fn", self.fn).values(key)
+
+    def _new_index(self, values=()):
+        if self.child_index == "inverse":
+            return childindex.InverseIndex(self.fn, self.inverse, values,
+                                           self._identity)
+        return childindex.SegmentIndex(self.fn, values, self._identity)
+
+    def _fold(self, node):
+        # subtree value of node computed from its key and its children
+        index = node.child_index
+        if index is not None:
+            total = index.total()
+            return node.key if total is None else self.fn(node.key, total)
+
+        # one builtin call beats a Python level loop once there are a few
+        # children to fold
+        children = node.children
+        if self._reduce is not None and len(children) > 8:
+            values = [child.subtree_value for child in children]
+            values.append(node.key)
+            return self._reduce(values)
+
+        value = node.key
+        for child in children:
+            value = self.fn(value, child.subtree_value)
+        return value
+
+    def _absorb(self, node, value):
+        # fn is idempotent and value was added below node, so every
+        # ancestor becomes fn(old, value) without refolding its children
+        fn = self.fn
+        touched = 0
+        while node is not None:
+            touched += 1
+            new = fn(node.subtree_value, value)
+            if new == node.subtree_value:
+                break
+            self._store(node, new)
+            node = node.parent
+        return touched
+
+    def _store(self, node, value):
+        # set the subtree value of node and keep the parent's index in sync
+        old = node.subtree_value
+        node.subtree_value = value
+
+        parent = node.parent
+        if parent is not None and parent.child_index is not None:
+            parent.child_index.replace(node.slot, old, value)
+
+    def _attach(self, parent, child):
+        child.slot = len(parent.children)
+        parent.children.append(child) # add child to the list of children
+        child.parent = parent #  connect child to parent
+
+        # a leaf only invalidates its own lca table, a whole subtree
+        # changing place invalidates every table below it
+        if self._lifts:
+            if child.children:
+                self._moved()
+            else:
+                self._lifts.pop(child, None)
+        if self.sizes:
+            self._resize(parent, child.subtree_size, child._height)
+
+        if self.child_index is not None:
+            if parent.child_index is None:
+                parent.child_index = self._new_index()
+            parent.child_index.append(child.subtree_value)
+
+    def _detach(self, parent, child):
+        # the last child moves into the freed slot, O(1) for any degree
+        size = child.subtree_size if self.sizes else 0
+        children = parent.children
+        index = parent.child_index
+        last = children.pop()
+
+        if last is not child:
+            children[child.slot] = last
+            if index is not None:
+                index.replace(child.slot, child.subtree_value, last.subtree_value)
+            last.slot = child.slot
+        if index is not None:
+            index.pop(last.subtree_value)
+
+        child.parent = None
+        child.slot = None
+        if size:
+            self._resize(parent, -size)
+
+    def _reinsert(self, parent, child, slot):
+        # undo _detach: attach child at the end, then trade places with the
+        # child that _detach moved into its slot
+        self._attach(parent, child)
+        children = parent.children
+        last = len(children) - 1
+        if slot == last:
+            return
+
+        # values read before relinking, as in swap()
+        other = children[slot]
+        other_value = other.subtree_value
+        child_value = child.subtree_value
+        children[slot], children[last] = child, other
+        child.slot, other.slot = slot, last
+        index = parent.child_index
+        if index is not None:
+            index.replace(slot, other_value, child_value)
+            index.replace(last, child_value, other_value)
+
+    def _need_sizes(self):
+        if not self.sizes:
+            raise ValueError("subtree sizes are only kept by "
+                             "Tree(fn, sizes=True)")
+
+    def _resize(self, node, size, height=-1):
+        # size nodes were added below node, or removed if negative, in a
+        # subtree of the given height under node. Heights are upper bounds
+        # that only removals can make loose, so they are never lowered.
+        if self.lazy:
+            # folded in by _refresh, node is marked dirty right after
+            node._grown += size
+            if height >= node._height:
+                node._height = height + 1
+            return
+
+        walked = 0
+        while node is not None:
+            height += 1
+            if not size and height <= node._height:
+                break
+            walked += 1
+            node._size += size
+            if height > node._height:
+                node._height = height
+            node = node.parent
+        self._walked += walked
+
+    def _settle(self, node):
+        # fold the size changes left below node by _resize in lazy mode in,
+        # and hand them on to the parent, which is dirty as well
+        parent = node.parent
+        grown = node._grown
+        if grown:
+            node._grown = 0
+            node._size += grown
+            if parent is not None:
+                parent._grown += grown
+        if parent is not None and node._height >= parent._height:
+            parent._height = node._height + 1
+
+    def _lift(self, node):
+        # the lifting table of node, building the missing ones of node and
+        # its ancestors top down so each parent is done before its children
+        lifts = self._lifts
+        table = lifts.get(node)
+        if table is not None:
+            return table
+
+        missing = []
+        n = node
+        while n is not None and n not in lifts:
+            missing.append(n)
+            n = n.parent
+
+        for n in reversed(missing):
+            p = n.parent
+            if p is None:
+                lifts[n] = (0, [], [])
+                continue
+            up = [p]
+            path = [n.key]
+            above = lifts[p]
+            k = 0
+            while k < len(above[1]):
+                path.append(self.fn(path[k], above[2][k]))
+                up.append(above[1][k])
+                k += 1
+                above = lifts[up[k]]
+            lifts[n] = (lifts[p][0] + 1, up, path)
+        return lifts[node]
+
+    def _fold_up(self, node, steps, value):
+        # fold the keys of node and its ancestors below steps levels up
+        # into value, with the path aggregates of the lifting tables
+        fn = self.fn
+        lifts = self._lifts
+        k = 0
+        while steps:
+            if steps & 1:
+                table = lifts[node]
+                value = fn(value, table[2][k])
+                node = table[1][k]
+            steps >>= 1
+            k += 1
+        return value
+
+    def _meet(self, x, y):
+        # lowest common ancestor of x and y; with fresh lifting tables this
+        # is an lca query, otherwise both paths are climbed in lock step so
+        # the cost is bounded by the longer of the two paths below it
+        if x in self._lifts and y in self._lifts:
+            return self.lca(x, y)
+
+        seen_x = set()
+        seen_y = set()
+        while x is not None or y is not None:
+            if x is not None:
+                if x in seen_y:
+                    return x
+                seen_x.add(x)
+                x = x.parent
+            if y is not None:
+                if y in seen_x:
+                    return y
+                seen_y.add(y)
+                y = y.parent
+        return None
+
+    def _changed(self, x, y=None):
+        # the children of x, and of y if given, changed: mark them dirty in
+        # lazy mode, remember them when inside batch() or refold now
+        if self.lazy:
+            touched = self._mark(x)
+            if y is not None:
+                touched += self._mark(y)
+            return touched
+
+        if self._dirty is not None:
+            self._dirty.append(x)
+            if y is not None:
+                self._dirty.append(y)
+            return 0
+
+        if y is None:
+            return self.update_subtree(x)
+        return self._update_pair(x, y)
+
+    def _mark(self, node):
+        # every ancestor of a dirty node is dirty too, so marking can stop
+        # at the first one that already is
+        touched = 0
+        while node is not None and not node._dirty:
+            touched += 1
+            node._dirty = True
+            node._tree = self
+            node = node.parent
+        return touched
+
+    def _refresh(self, node):
+        # recompute node and its dirty descendants, children first, without
+        # recursion; clean children are read from their cache
+        order = [node]
+        for n in order:
+            for c in n.children:
+                if c._dirty:
+                    order.append(c)
+
+        sizes = self.sizes
+        for n in reversed(order):
+            n._dirty = False
+            self._store(n, self._fold(n))
+            if sizes:
+                self._settle(n)
+
+    def _flush(self, dirty):
+        # the dirty nodes and all their ancestors, with the number of their
+        # children in that set still to be refolded
+        pending = {}
+        for n in dirty:
+            while n is not None and n not in pending:
+                pending[n] = 0
+                n = n.parent
+        for n in pending:
+            if n.parent is not None:
+                pending[n.parent] += 1
+
+        # refold children before parents, each node at most once and only
+        # if it is dirty itself or one of its children changed value
+        changed = set(dirty)
+        ready = [n for n, count in pending.items() if count == 0]
+        touched = 0
+
+        for n in ready:
+            parent = n.parent
+            if n in changed:
+                touched += 1
+                value = self._fold(n)
+                if value != n.subtree_value:
+                    self._store(n, value)
+                    if parent is not None:
+                        changed.add(parent)
+
+            if parent is not None:
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    ready.append(parent)
+
+        return touched
+
+    def _refolded(self):
+        # called once the refold deferred by batch() is done, also by
+        # asynctree.AsyncTree after its own refold; subclasses keeping
+        # state derived from subtree values bring it up to date here
+        pass
+
+    def _update_pair(self, x, y):
+        # refold two paths whose children changed: each side climbs to the
+        # meeting point with its own early exit, and the shared path above it
+        # is walked once
+        meet = self._meet(x, y)
+        touched = 0
+        reached = False
+
+        for start in (x, y):
+            node = start
+            while node is not meet:
+                touched += 1
+                value = self._fold(node)
+                if value == node.subtree_value:
+                    break
+                self._store(node, value)
+                node = node.parent
+            else:
+                reached = True
+
+        if reached and meet is not None:
+            touched += self.update_subtree(meet)
+        return touched